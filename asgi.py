@@ -0,0 +1,12 @@
+# asgi.py
+#
+# Точка входа для варианта на asyncio: uvicorn asgi:app --workers 1
+# Вариант на eventlet по-прежнему запускается через Procfile (gunicorn server:app).
+
+import os
+
+os.environ['RPL_RUNTIME'] = 'asyncio'
+
+from server import runtime
+
+app = runtime.asgi_app
@@ -0,0 +1,89 @@
+"""
+Замер конца PvP партии по стадиям, как они идут в server.py:
+  - game_over: изменения рейтингов по снимку из памяти и сборка сообщения — до отправки игрокам;
+  - транзакция: commit_game_result (оба игрока FOR UPDATE, Глико, строка game_result, commit) — после;
+  - повтор: тот же room_id еще раз (идемпотентность, без записи).
+По умолчанию — временная SQLite; для PostgreSQL задайте DATABASE_URL (создаются игроки bench_p1/bench_p2).
+
+    python misc/bench_finalize.py --games 200
+    DATABASE_URL=postgresql://... python misc/bench_finalize.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+# server.py читает players.csv из текущего каталога
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+import server
+
+NICKNAMES = ['bench_p1', 'bench_p2']
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def ensure_players():
+    with server.app.app_context():
+        for nickname in NICKNAMES:
+            if not server.User.query.filter_by(nickname=nickname).first():
+                server.db.session.add(server.User(nickname=nickname, rating=1500, rd=350, vol=0.06))
+        server.db.session.commit()
+        return {u.nickname: (u.rating, u.rd, u.vol) for u in server.User.query.filter(server.User.nickname.in_(NICKNAMES))}
+
+
+def finished_game(snapshots, p1_wins):
+    players = [{'sid': f"bench{i}", 'nickname': nickname, 'rating_snapshot': snapshots[nickname]} for i, nickname in enumerate(NICKNAMES)]
+    game = server.GameState(players[0], server.all_leagues_data, player2_info=players[1], mode='pvp', settings={'num_rounds': 1})
+    game.scores = {0: 1.0, 1: 0.0} if p1_wins else {0: 0.0, 1: 1.0}
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер стадий конца PvP партии: game_over из памяти и транзакция с рейтингами.")
+    parser.add_argument('--games', type=int, default=200)
+    args = parser.parse_args()
+
+    game_over_ms, commit_ms, duplicate_ms = [], [], []
+    for i in range(args.games):
+        # Снимок рейтингов на старте партии, как в join_game; в замер не входит
+        game = finished_game(ensure_players(), p1_wins=i % 2 == 0)
+        room_id = f"bench-{uuid.uuid4()}"
+
+        started_at = time.perf_counter()
+        game_over_data = {'roomId': room_id, 'final_scores': game.scores, 'players': game.nicknames_for_client,
+                          'history': game.round_history, 'mode': game.mode, 'end_reason': game.end_reason,
+                          'rating_changes': server.preview_rating_changes(game)}
+        game_over_ms.append((time.perf_counter() - started_at) * 1000)
+
+        started_at = time.perf_counter()
+        status, rating_changes, _ = server.commit_game_result(room_id, NICKNAMES, dict(game.scores))
+        commit_ms.append((time.perf_counter() - started_at) * 1000)
+        if status != 'ok': raise SystemExit(f"[BENCH] Транзакция не прошла: {status}")
+
+        started_at = time.perf_counter()
+        status, _, _ = server.commit_game_result(room_id, NICKNAMES, dict(game.scores))
+        duplicate_ms.append((time.perf_counter() - started_at) * 1000)
+        if status != 'duplicate': raise SystemExit(f"[BENCH] Повтор записал партию второй раз: {status}")
+        if game_over_data['rating_changes'] != rating_changes:
+            print(f"[BENCH] Показано {game_over_data['rating_changes']}, записано {rating_changes}")
+
+    print(f"[BENCH] {args.games} партий, БД: {server.app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]}")
+    for name, values in (('game_over (до отправки)', game_over_ms), ('транзакция (после)', commit_ms), ('повтор room_id', duplicate_ms)):
+        p50, p95 = percentiles(values)
+        print(f"  {name:<24} p50 {p50:7.2f} мс   p95 {p95:7.2f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,58 @@
+"""
+Проверка поиска ответов по всему составу лиги: для каждого игрока каждого клуба
+игрок считается уже названным, и его фамилия вводится повторно — кириллицей и латиницей.
+Ответ не должен засчитаться другому игроку, у которого лишь совпал грубый фонетический
+ключ (Бакаев / Бокоев); засчитать можно только игрока с тем же псевдонимом или транслитом.
+Нарушения печатаются, код возврата 1.
+
+    python misc/check_aliases.py
+"""
+
+import os
+import sys
+
+# server.py читает players.csv из текущего каталога
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+import server
+
+
+def start_club_round(league_name, club_name):
+    game = server.GameState({'sid': 'check', 'nickname': 'check'}, server.all_leagues_data,
+                            settings={'league': league_name, 'selected_clubs': [club_name]})
+    game.start_new_round()
+    return game
+
+
+def allowed_matches(game, guess_norm):
+    """Кому можно засчитать повтор: игрокам с тем же псевдонимом или тем же транслитом."""
+    key = server.translit_key(guess_norm)
+    return {p['full_name'] for p in game.players_for_comparison
+            if guess_norm in p['valid_normalized_names'] or any(server.translit_key(a) == key for a in p['valid_normalized_names'])}
+
+
+def main():
+    failures, checked, phonetic_collisions = [], 0, 0
+    for league_name, fragments in server.club_fragments.items():
+        for club_name, fragment in fragments.items():
+            phonetic_collisions += sum(1 for players in fragment['alias_index']['phonetic'].values() if len(players) > 1)
+            for named in fragment['players']:
+                for guess in (named['primary_name'], server.transliterate(named['primary_name'])):
+                    game = start_club_round(league_name, club_name)
+                    game.add_named_player(named, 0)
+                    result = game.process_guess(guess)
+                    checked += 1
+                    credited = result.get('player_data', {}).get('full_name')
+                    if credited and credited not in allowed_matches(game, guess.lower().replace('ё', 'е')):
+                        failures.append(f"{club_name}: повтор «{guess}» (назван {named['full_name']}) засчитан {credited} как {result['result']}")
+    print(f"[CHECK] Проверено повторов: {checked}, фонетических коллизий внутри клубов: {phonetic_collisions}.")
+    if failures:
+        print("[CHECK] ПРОВАЛ:\n  " + "\n  ".join(failures))
+        return 1
+    print("[CHECK] Повторы фамилий не засчитываются другим игрокам.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,77 +1,197 @@
-import pandas as pd
-from bs4 import BeautifulSoup
+import argparse
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
 
-def parse_local_html_file(local_filename="rplquizbot/index.html", output_filename="rpl_players_from_local_file.xlsx"):
+CHUNK_SIZE = 64 * 1024
+ALIAS_COLUMNS = 4  # В players.csv после имени и клуба всегда идут 4 колонки псевдонимов
+MIN_SQUAD_SIZE = 11
+SKIPPED_HEADERS = {'Содержание', 'Примечания', 'Ссылки', 'См. также'}
+SKIPPED_NAMES = {'тренер'}
+SKIPPED_SECTIONS = ('тренер',)  # Разделы таблицы вроде «Тренеры» — это не игроки
+
+
+class SquadPageParser(HTMLParser):
+    """
+    Потоковый разбор страницы с составами: заголовок <h2> задает клуб,
+    первая следующая за ним таблица 'wikitable' — его состав.
+    Имя игрока берется из ссылки во ВТОРОМ столбце строки,
+    строки-заголовки (<th>) делят таблицу на разделы.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.clubs = []  # [(клуб, [имена игроков])] в порядке страницы
+        self._in_h2, self._h2_text = False, []
+        self._current_club = None
+        self._table_depth, self._squad_table_depth = 0, None
+        self._cell_index, self._in_cell, self._in_link = -1, False, False
+        self._link_text, self._row_player = [], None
+        self._in_th, self._th_text, self._section = False, [], ''
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h2':
+            self._in_h2, self._h2_text = True, []
+        elif tag == 'table':
+            self._table_depth += 1
+            classes = (dict(attrs).get('class') or '').split()
+            if self._current_club and self._squad_table_depth is None and 'wikitable' in classes:
+                self._squad_table_depth = self._table_depth
+        elif self._squad_table_depth == self._table_depth:
+            if tag == 'tr':
+                self._cell_index, self._row_player, self._th_text = -1, None, []
+            elif tag == 'th':
+                self._in_th = True
+            elif tag == 'td':
+                self._cell_index += 1
+                self._in_cell = True
+            elif tag == 'a' and self._in_cell and self._cell_index == 1 and self._row_player is None:
+                self._in_link, self._link_text = True, []
+
+    def handle_endtag(self, tag):
+        if tag == 'h2' and self._in_h2:
+            self._in_h2 = False
+            header = re.sub(r'\s+', ' ', ''.join(self._h2_text)).strip()
+            if header and header not in SKIPPED_HEADERS:
+                self._current_club = header
+                self._squad_table_depth, self._section = None, ''
+        elif tag == 'table':
+            if self._squad_table_depth == self._table_depth:
+                # Состав клуба прочитан — ждем следующий заголовок
+                self._squad_table_depth, self._current_club = None, None
+            self._table_depth -= 1
+        elif self._squad_table_depth == self._table_depth:
+            if tag == 'a' and self._in_link:
+                self._in_link = False
+                self._row_player = re.sub(r'\s+', ' ', ''.join(self._link_text)).strip()
+            elif tag == 'td':
+                self._in_cell = False
+            elif tag == 'th':
+                self._in_th = False
+            elif tag == 'tr' and self._th_text and self._cell_index == -1:
+                self._section = ''.join(self._th_text).strip().lower()
+            elif tag == 'tr' and self._row_player and not any(s in self._section for s in SKIPPED_SECTIONS):
+                if not self.clubs or self.clubs[-1][0] != self._current_club:
+                    self.clubs.append((self._current_club, []))
+                self.clubs[-1][1].append(self._row_player)
+
+    def handle_data(self, data):
+        if self._in_h2: self._h2_text.append(data)
+        if self._in_link: self._link_text.append(data)
+        if self._in_th: self._th_text.append(data)
+
+
+def parse_squad_page(filename):
+    """Читает страницу кусками по CHUNK_SIZE, не загружая ее в память целиком."""
+    parser = SquadPageParser()
+    with open(filename, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk: break
+            parser.feed(chunk)
+    parser.close()
+    return parser.clubs
+
+
+def load_known_aliases(filename):
+    """Псевдонимы, собранные вручную в существующем players.csv: полное имя -> [псевдонимы]."""
+    known_aliases = {}
+    if not filename or not os.path.exists(filename): return known_aliases
+    with open(filename, mode='r', encoding='utf-8') as infile:
+        for row in csv.reader(infile):
+            if len(row) > 2 and row[0]:
+                known_aliases[row[0]] = [a for a in row[2:] if a]
+    return known_aliases
+
+
+def generate_surname_aliases(full_name, known_aliases):
+    """Ручные псевдонимы плюс написания составной фамилии слитно и через пробел."""
+    surname = full_name.split()[-1]
+    aliases = list(known_aliases.get(full_name, []))
+    if '-' in surname:
+        aliases += [surname.replace('-', ' '), surname.replace('-', '')]
+    normalized_seen = {surname.lower().replace('ё', 'е')}
+    unique_aliases = []
+    for alias in aliases:
+        alias_norm = alias.lower().replace('ё', 'е')
+        if alias_norm not in normalized_seen:
+            normalized_seen.add(alias_norm)
+            unique_aliases.append(alias)
+    return unique_aliases
+
+
+def build_league_rows(clubs, known_aliases, unique_players=False):
     """
-    Парсит локальный HTML-файл (index.html), извлекает данные об игроках
-    и сохраняет результат в файл Excel (.xlsx).
+    Проверяет составы и формирует строки players.csv. Дубли внутри клуба убираются всегда.
+    Игрок в нескольких клубах (переход по ходу сезона) по умолчанию остается во всех,
+    с unique_players=True — только в первом.
     """
-    try:
-        # Открываем и читаем локальный HTML-файл с указанием кодировки utf-8
-        with open(local_filename, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-    except FileNotFoundError:
-        print(f"Ошибка: файл '{local_filename}' не найден.")
-        print("Убедитесь, что вы сохранили веб-страницу как 'index.html' в той же папке, где находится скрипт.")
-        return
-    except Exception as e:
-        print(f"Произошла ошибка при чтении файла: {e}")
-        return
-
-    # Используем BeautifulSoup для парсинга HTML-содержимого файла
-    soup = BeautifulSoup(html_content, 'lxml')
-    
-    all_players_data = []
-
-    # Находим все заголовки H2, которые являются названиями клубов
-    club_headers = soup.find_all('h2')
-
-    for header in club_headers:
-        club_name_span = header
-        if not club_name_span:
-            continue
-        
-        # Получаем чистое название клуба
-        cleantext = BeautifulSoup(header, "lxml").text
-
-        club_name = cleantext # club_name_span.get_text().strip()
-
-        # Ищем следующую за заголовком таблицу с классом 'wikitable'
-        team_table = header.find_next_sibling('table', class_='wikitable')
-        
-        if team_table:
-            # Проходим по всем строкам таблицы, пропуская заголовок (первую строку)
-            rows = team_table.find_all('tr')[1:]
-            for row in rows:
-                cols = row.find_all('td')
-                
-                # Проверяем, что в строке есть ячейки
-                if len(cols) > 1:
-                    # --- Ключевое изменение ---
-                    # Имя игрока находится во ВТОРОМ столбце (индекс 1)
-                    player_name_cell = cols[1].find('a') 
-                    
-                    if player_name_cell:
-                        player_name = player_name_cell.get_text().strip()
-                        
-                        # Пропускаем строки, где в имени игрока может быть тренер
-                        if player_name.lower() not in ["тренер"]:
-                            all_players_data.append({'Клуб': club_name, 'Имя игрока': player_name})
-
-    if not all_players_data:
-        print("Не удалось найти данные игроков. Проверьте структуру HTML-файла.")
-        return
-
-    # Создаем DataFrame и сохраняем его в Excel
-    df = pd.DataFrame(all_players_data)
-
-    try:
-        df.to_excel(output_filename, index=False)
-        print(f"Файл '{output_filename}' успешно создан!")
-    except Exception as e:
-        print(f"Произошла ошибка при сохранении файла Excel: {e}")
+    rows, warnings, seen_players = [], [], {}
+    for club_name, player_names in clubs:
+        club_players, club_seen = [], set()
+        for player_name in player_names:
+            if player_name.lower() in SKIPPED_NAMES or player_name in club_seen: continue
+            if any(ch.isdigit() for ch in player_name):
+                warnings.append(f"{club_name}: подозрительное имя '{player_name}' пропущено")
+                continue
+            if player_name in seen_players:
+                action = 'пропущен' if unique_players else 'оставлен'
+                warnings.append(f"{player_name}: уже есть в составе {seen_players[player_name]}, дубль в {club_name} {action}")
+                if unique_players: continue
+            else:
+                seen_players[player_name] = club_name
+            club_seen.add(player_name)
+            club_players.append(player_name)
+        if len(club_players) < MIN_SQUAD_SIZE:
+            warnings.append(f"{club_name}: в составе всего {len(club_players)} игроков")
+        for player_name in club_players:
+            aliases = generate_surname_aliases(player_name, known_aliases)
+            rows.append([player_name, club_name] + aliases + [''] * (ALIAS_COLUMNS - len(aliases)))
+    return rows, warnings
+
+
+def ingest_league(job):
+    """Обрабатывает одну страницу лиги целиком; выполняется в отдельном процессе."""
+    page_filename, output_filename, aliases_filename, unique_players = job
+    clubs = parse_squad_page(page_filename)
+    rows, warnings = build_league_rows(clubs, load_known_aliases(aliases_filename), unique_players)
+    if rows:
+        with open(output_filename, 'w', encoding='utf-8', newline='') as outfile:
+            csv.writer(outfile, lineterminator='\n').writerows(rows)
+    return page_filename, output_filename, len(clubs), len(rows), warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Собирает players.csv из сохраненных страниц с составами клубов.")
+    parser.add_argument('pages', nargs='+', help="HTML-страницы лиг (по одной на лигу)")
+    parser.add_argument('--output', help="Файл результата, если страница одна (по умолчанию <страница>.csv)")
+    parser.add_argument('--out-dir', default='.', help="Каталог для результатов, если страниц несколько")
+    parser.add_argument('--aliases', default='players.csv', help="CSV с ручными псевдонимами, которые нужно сохранить")
+    parser.add_argument('--unique-players', action='store_true', help="Оставлять игрока только в первом клубе, где он встретился")
+    parser.add_argument('--workers', type=int, default=None, help="Число параллельных процессов")
+    args = parser.parse_args()
+
+    jobs = []
+    for page in args.pages:
+        if args.output and len(args.pages) == 1:
+            output_filename = args.output
+        else:
+            output_filename = os.path.join(args.out_dir, os.path.splitext(os.path.basename(page))[0] + '.csv')
+        jobs.append((page, output_filename, args.aliases, args.unique_players))
+
+    failed = False
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for page, output_filename, num_clubs, num_rows, warnings in executor.map(ingest_league, jobs):
+            for warning in warnings: print(f"  [!] {warning}")
+            if not num_rows:
+                print(f"Не удалось найти данные игроков в '{page}'. Проверьте структуру HTML-файла.")
+                failed = True
+            else:
+                print(f"'{page}': клубов {num_clubs}, игроков {num_rows} -> '{output_filename}'")
+    return 1 if failed else 0
 
 
 if __name__ == '__main__':
-    # Вызываем функцию для парсинга локального файла index.html
-    parse_local_html_file()
\ No newline at end of file
+    raise SystemExit(main())
@@ -0,0 +1,308 @@
+"""
+Воспроизводит трассу, записанную сервером с SOCKET_TRACE=файл, против локального сервера:
+каждый записанный клиент получает свою сессию Socket.IO, входящие события отправляются
+в исходном порядке и с исходными интервалами (или в --speed раз быстрее).
+
+Клубы в раундах выпадают случайно, поэтому ответы игроков переносятся по смыслу:
+верный ответ становится верным ответом для текущего клуба, ответ с опечаткой — опечаткой,
+промах отправляется как был. Первый ход в партии тоже случаен, поэтому ход (ответ или сдачу)
+отправляет тот участник комнаты, чей ход сейчас, а ответ сервера засчитывается записанному игроку. Таймеры сервера (банк времени, пауза между раундами) идут
+в реальном времени, поэтому при --speed больше 1 часть партий закончится иначе, чем в записи,
+и расхождение вырастет — для сравнения производительности сравнивайте прогоны на одной скорости.
+В конце печатаются задержки ответов по событиям (рядом — время обработчика из записи)
+и расхождение потока ответов сервера с записанным.
+
+Нужен клиент: pip install "python-socketio[client]"
+
+    python misc/replay_trace.py trace.jsonl.gz --url http://127.0.0.1:5000 --speed 4
+"""
+
+import argparse
+import difflib
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import threading
+import time
+
+import socketio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from socket_trace import NICKNAME_KEYS, load_trace, summarize
+
+CORRECT_RESULTS = ('correct', 'correct_typo')
+AUTH_EVENTS = ('register_user', 'login_user')
+REPLAY_PASSWORD = 'replay'
+CONNECT_TIMEOUT = 10
+TURN_EVENTS = ('submit_guess', 'surrender_round')
+# Чем сервер отвечает на входящее событие: задержка меряется до первого такого сообщения этому клиенту,
+# сколько бы ни шел ответ (под asyncio запросы к БД отвечают через run_blocking позже обработчика)
+RESPONSE_EVENTS = {
+    'connect': ('update_lobby',), 'register_user': ('auth_status',), 'login_user': ('auth_status',),
+    'get_leaderboard': ('leaderboard_data',), 'get_league_clubs': ('league_clubs_data',),
+    'get_live_games': ('live_games_data',), 'spectate_game': ('spectator_snapshot',),
+    'get_tournaments': ('tournaments_data',), 'create_tournament': ('tournament_created',),
+    'create_game': ('update_lobby',), 'cancel_game': ('update_lobby',),
+    'join_game': ('round_started',), 'start_game': ('round_started',),
+    'submit_guess': ('guess_result',), 'surrender_round': ('timer_expired',),
+    'request_skip_pause': ('skip_vote_accepted', 'round_started', 'game_over')
+}
+BROADCAST_REPLIES = ('create_game', 'cancel_game')  # Отвечают рассылкой всем, а не лично
+
+
+def prepare(records):
+    """
+    Раскладывает трассу: входящие события по порядку, ожидаемые ответы по клиентам
+    (сообщения комнатам раскрываются по составу комнаты на тот момент), вид каждого ответа
+    игрока и событие, которым сервер ответил на каждое входящее (для замера задержки).
+    """
+    broadcast_events = {r[3] for r in records if r[0] == 'o' and r[2] == '*'}
+    members, expected, awaiting = {}, {}, {}
+    inbound, timeline = [], []
+    for record in records:
+        kind = record[0]
+        if kind == 'j':
+            members.setdefault(record[3], set()).add(record[2])
+            timeline.append(record)
+        elif kind == 'l':
+            members.get(record[3], set()).discard(record[2])
+            timeline.append(record)
+        elif kind == 'c':
+            members.pop(record[2], None)
+            timeline.append(record)
+        elif kind == 'i':
+            entry = {'t': record[1], 'client': record[2], 'event': record[3], 'data': record[4],
+                     'handler_ms': record[5], 'guess_kind': None, 'response': None}
+            inbound.append(entry)
+            timeline.append(entry)
+            if record[3] in RESPONSE_EVENTS: awaiting.setdefault(record[2], []).append(entry)
+        elif kind == 'o':
+            event, to = record[3], record[2]
+            if to == '*': recipients = list(awaiting)
+            elif to.startswith('c'): recipients = [to]
+            else: recipients = sorted(members.get(to, ()))
+            for client in recipients:
+                if to != '*' and event not in broadcast_events:
+                    expected.setdefault(client, []).append((event, json.dumps(record[4], sort_keys=True)))
+                match_response(awaiting.get(client), event, record[4], broadcast=to == '*')
+    return inbound, timeline, expected, broadcast_events
+
+
+def match_response(awaiting, event, data, broadcast):
+    """Ответ достается самому раннему из ждущих событий клиента, которому подходит."""
+    for entry in awaiting or ():
+        if event not in RESPONSE_EVENTS[entry['event']]: continue
+        if broadcast and entry['event'] not in BROADCAST_REPLIES: continue
+        awaiting.remove(entry)
+        entry['response'] = event
+        if event == 'guess_result': entry['guess_kind'] = (data or {}).get('result')
+        return
+
+
+class ReplayClient:
+    def __init__(self, alias, replay):
+        self.alias, self.replay = alias, replay
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('*', self.on_any)
+        self.sid, self.room_id, self.state, self.turn = None, None, None, None
+        self.received, self.waiting, self.ready = [], [], threading.Event()
+        self.acting_for = None  # Чей записанный ход этот клиент отправил последним
+
+    def connect(self, url):
+        # Подключение занимает сотни миллисекунд — не задерживаем им остальных клиентов
+        try:
+            self.client.connect(url, transports=['websocket'])
+            self.sid = self.client.get_sid()
+            with self.replay.lock: self.replay.by_sid[self.sid] = self
+        except socketio.exceptions.ConnectionError as e:
+            print(f"[REPLAY] {self.alias}: не удалось подключиться: {e}")
+        self.ready.set()
+
+    def on_any(self, event, data=None):
+        if isinstance(data, dict):
+            if data.get('roomId'):
+                self.room_id = data['roomId']
+                self.replay.learn_room(self.alias, data['roomId'])
+            if 'fullPlayerList' in data and 'namedPlayers' in data: self.state = data
+            if 'currentPlayerIndex' in data and 'players' in data: self.turn = data
+        with self.replay.lock:
+            waiting = next((w for w in self.waiting if w[0] == event), None)
+            if waiting:
+                self.waiting.remove(waiting)
+                self.replay.latencies.setdefault(waiting[1], []).append((time.perf_counter() - waiting[2]) * 1000)
+        if event in self.replay.broadcast_events: return
+        # Ответ на ход, отправленный за другого игрока, засчитываем тому, кто ходил в записи
+        owner = self.acting_for if event == 'guess_result' and self.acting_for else self
+        owner.received.append((event, json.dumps(summarize(data), sort_keys=True)))
+
+    def turn_holder(self):
+        """Клиент, чей ход сейчас в комнате этого клиента, по последнему состоянию партии."""
+        turn = self.turn
+        if not turn: return None
+        player = turn['players'].get(str(turn['currentPlayerIndex'])) or {}
+        return self.replay.by_sid.get(player.get('sid'))
+
+
+class Replay:
+    def __init__(self, args, records):
+        self.args = args
+        self.inbound, self.timeline, self.expected, self.broadcast_events = prepare(records)
+        # Время в трассе отсчитывается от старта записи на сервере, а не от первого события
+        self.first_t = records[0][1] if records else 0
+        self.clients, self.latencies, self.lock = {}, {}, threading.Lock()
+        self.by_sid = {}  # настоящий sid -> клиент воспроизведения
+        self.rooms, self.members = {}, {}  # псевдоним комнаты -> настоящий id; клиент -> его комнаты по записи
+        tag = ''.join(random.choices(string.ascii_lowercase, k=3))
+        self.nicknames = lambda alias: f"{tag}{alias}"[:15]
+
+    def learn_room(self, client_alias, room_id):
+        # Первый увиденный id комнаты относим к последней еще неизвестной комнате клиента по записи
+        with self.lock:
+            if room_id in self.rooms.values(): return
+            unknown = [r for r in self.members.get(client_alias, []) if r not in self.rooms]
+            if unknown: self.rooms[unknown[-1]] = room_id
+
+    def translate(self, client, value, key=None):
+        if isinstance(value, dict):
+            return {k: self.translate(client, v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.translate(client, v) for v in value]
+        if isinstance(value, str):
+            if key in NICKNAME_KEYS: return self.nicknames(value)
+            if value in self.clients and self.clients[value].sid: return self.clients[value].sid
+            if value in self.rooms: return self.rooms[value]
+            if key == 'roomId' and client.room_id: return client.room_id
+        return value
+
+    def rewrite_guess(self, client, guess, kind):
+        """Переносит ответ на клуб текущего раунда, сохраняя его вид."""
+        state = client.state
+        if kind not in CORRECT_RESULTS or not state: return guess
+        named = {p.get('full_name') for p in state['namedPlayers']}
+        unnamed = [name for name in state['fullPlayerList'] if name not in named]
+        if not unnamed: return guess
+        surname = random.choice(unnamed).split()[-1]
+        if kind == 'correct_typo' and len(surname) > 4:
+            pos = random.randrange(1, len(surname) - 1)
+            surname = surname[:pos] + surname[pos + 1:]
+        return surname
+
+    def send(self, entry):
+        alias, event = entry['client'], entry['event']
+        if event == 'connect':
+            client = self.clients[alias] = ReplayClient(alias, self)
+            threading.Thread(target=client.connect, args=(self.args.url,), daemon=True).start()
+            return
+        client = self.clients.get(alias)
+        if not client: return
+        client.ready.wait(CONNECT_TIMEOUT)
+        if not client.client.connected: return
+        if event == 'disconnect':
+            client.client.disconnect()
+            return
+        data = self.translate(client, entry['data'])
+        if event in AUTH_EVENTS and isinstance(data, dict): data['password'] = REPLAY_PASSWORD
+        if event == 'submit_guess' and isinstance(data, dict):
+            data['guess'] = self.rewrite_guess(client, data.get('guess'), entry['guess_kind'])
+        sender = client
+        if event in TURN_EVENTS:
+            # Ходит тот, чей ход сейчас: в записи первым мог ходить другой участник комнаты
+            holder = client.turn_holder()
+            if holder and holder.client.connected: sender = holder
+            sender.acting_for = client if sender is not client else None
+        if entry['response']:
+            with self.lock:
+                # Прошлое такое же событие без ответа больше не ждем, иначе ему достанется чужой ответ
+                sender.waiting = [w for w in sender.waiting if w[1] != event]
+                sender.waiting.append((entry['response'], event, time.perf_counter()))
+        args = () if data is None else (data,)
+        try:
+            sender.client.emit(event, *args)
+        except socketio.exceptions.BadNamespaceError:
+            pass  # Сервер уже закрыл эту сессию
+
+    def run(self):
+        started_at, lags = time.perf_counter(), []
+        for entry in self.timeline:
+            if isinstance(entry, list):
+                # Состав комнат по записи нужен, чтобы сопоставлять псевдонимы комнат с настоящими
+                kind = entry[0]
+                with self.lock:
+                    if kind == 'j': self.members.setdefault(entry[2], []).append(entry[3])
+                    elif kind == 'l' and entry[3] in self.members.get(entry[2], []): self.members[entry[2]].remove(entry[3])
+                continue
+            due = started_at + (entry['t'] - self.first_t) / 1000 / self.args.speed
+            delay = due - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            lags.append(max(0.0, -delay) * 1000)
+            self.send(entry)
+        time.sleep(self.args.settle)
+        for client in self.clients.values():
+            if client.client.connected: client.client.disconnect()
+        return time.perf_counter() - started_at, lags
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(replay, elapsed, lags, recorded_span):
+    print(f"[REPLAY] Отправлено событий: {len(replay.inbound)}, клиентов: {len(replay.clients)}. "
+          f"Запись {recorded_span:.1f} c, воспроизведение {elapsed:.1f} c (x{replay.args.speed}). "
+          f"Отставание от расписания: p95 {percentile(lags, 0.95) if lags else 0:.1f} мс, макс {max(lags, default=0):.1f} мс")
+
+    handler_ms = {}
+    for entry in replay.inbound: handler_ms.setdefault(entry['event'], []).append(entry['handler_ms'])
+    print(f"  {'событие':<20} {'кол-во':>7} {'обработчик p50/p95 (запись), мс':>32} {'ответ p50/p95/макс (сейчас), мс':>34}")
+    for event, recorded in sorted(handler_ms.items(), key=lambda kv: -len(kv[1])):
+        observed = replay.latencies.get(event, [])
+        replayed = f"{statistics.median(observed):.1f} / {percentile(observed, 0.95):.1f} / {max(observed):.1f}" if observed else '-'
+        print(f"  {event:<20} {len(recorded):>7} {statistics.median(recorded):>15.2f} / {percentile(recorded, 0.95):<14.2f} {replayed:>34}")
+
+    matched = total = 0
+    mismatched_events = {}
+    for alias, expected in replay.expected.items():
+        actual = replay.clients[alias].received if alias in replay.clients else []
+        matcher = difflib.SequenceMatcher(a=expected, b=actual, autojunk=False)
+        matched += sum(block.size for block in matcher.get_matching_blocks())
+        total += max(len(expected), len(actual))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal': continue
+            for event, _ in expected[i1:i2] + actual[j1:j2]:
+                mismatched_events[event] = mismatched_events.get(event, 0) + 1
+    divergence = 1 - matched / total if total else 0.0
+    print(f"[REPLAY] Расхождение ответов сервера с записью: {divergence:.1%} ({total - matched} из {total}).")
+    if mismatched_events:
+        top = sorted(mismatched_events.items(), key=lambda kv: -kv[1])[:8]
+        print("  Чаще всего расходятся: " + ", ".join(f"{event} ({count})" for event, count in top))
+    return divergence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанной трассы Socket.IO против локального сервера.")
+    parser.add_argument('trace', help="Файл трассы (SOCKET_TRACE), .jsonl или .jsonl.gz")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help="Ускорение относительно записи (1 — в реальном времени)")
+    parser.add_argument('--settle', type=float, default=3.0, help="Ожидание последних ответов после конца трассы, с")
+    parser.add_argument('--max-divergence', type=float, default=None, help="Доля расхождений, выше которой код возврата 1")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if args.seed is not None: random.seed(args.seed)
+
+    records = load_trace(args.trace)
+    replay = Replay(args, records)
+    recorded_span = (records[-1][1] - records[0][1]) / 1000 if records else 0.0
+    elapsed, lags = replay.run()
+    divergence = report(replay, elapsed, lags, recorded_span)
+    if args.max_divergence is not None and divergence > args.max_divergence:
+        print(f"[REPLAY] Расхождение выше порога {args.max_divergence:.1%}.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
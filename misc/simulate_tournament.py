@@ -0,0 +1,75 @@
+"""
+Симуляция швейцарского турнира между ботами целиком в памяти, без сети и без БД:
+все партии тура стартуют одной пачкой, как на настоящем турнире. После турнира
+проверяются инварианты швейцарской системы; нарушение — ошибка и код возврата 1.
+Окружение выбирается так же, как у сервера (RPL_RUNTIME=eventlet|asyncio).
+
+    python misc/simulate_tournament.py --players 256
+    RPL_RUNTIME=asyncio python misc/simulate_tournament.py --players 256 --rounds 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# server.py читает players.csv из текущего каталога
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+import server
+
+
+class SimulationError(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition: raise SimulationError(message)
+
+
+def simulate(num_players=256, num_rounds=None):
+    """Прогоняет турнир и проверяет, что все сыграли поровну туров и все партии закрыты."""
+    started_at = time.time()
+    tournament = server.create_tournament(f"Симуляция {num_players}", None, {'num_rounds': 3, 'time_bank': 30.0}, num_rounds=num_rounds,
+                                          persist_ratings=False, session_overrides={'pause_between_rounds': 0, 'bot_turn_delay': 0})
+    for i in range(num_players):
+        rating = random.uniform(1200, 1800)
+        server.add_tournament_entrant(tournament, f"Bot{i:03d}", 'BOT', skill=0.6 + (rating - 1200) / 2000, rating=rating, rd=200.0)
+    server.runtime.run_until(lambda: server.start_tournament(tournament['id']), lambda: tournament['status'] == 'finished')
+
+    entrants = tournament['entrants'].values()
+    games_per_entrant = {len(e['results']) + e['had_bye'] for e in entrants}
+    check(games_per_entrant == {tournament['num_rounds']}, f"Неравное число туров у участников: {games_per_entrant}")
+    total_points = sum(e['score'] for e in entrants)
+    expected_points = tournament['num_rounds'] * (num_players // 2 + num_players % 2)
+    check(total_points == expected_points, f"Неверная сумма очков: {total_points}, ожидалось {expected_points}")
+    check(not any(g.get('tournament_id') == tournament['id'] for g in server.active_games.values()), "Остались незавершенные партии")
+    check(all(e['rating'] > 0 and e['rd'] > 0 for e in entrants), "Некорректные рейтинги после пакетного обновления")
+
+    standings = server.get_tournament_standings(tournament)
+    print(f"[TOURNAMENT] Симуляция ({server.runtime.name}): {num_players} ботов, {tournament['num_rounds']} туров за {time.time() - started_at:.1f} c.")
+    for place, row in enumerate(standings[:10], 1):
+        print(f"  {place:>3}. {row['nickname']}  {row['score']}  {row['rating']} ({row['rating_change']:+d})")
+    return tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция швейцарского турнира между ботами.")
+    parser.add_argument('--players', type=int, default=256)
+    parser.add_argument('--rounds', type=int, default=None, help="Число туров (по умолчанию log2 от числа участников)")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if args.players < 2: parser.error("нужно хотя бы 2 участника")
+    if args.seed is not None: random.seed(args.seed)
+    try:
+        simulate(args.players, args.rounds)
+    except SimulationError as e:
+        print(f"[TOURNAMENT] ПРОВАЛ: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
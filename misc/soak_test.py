@@ -0,0 +1,316 @@
+"""
+Длительный прогон (soak) против запущенного сервера: виртуальные игроки бесконечно играют
+тренировки и PvP — угадывают, ошибаются в написании, сдаются, голосуют за пропуск паузы
+и отключаются посреди игры. Параллельно через /admin/rooms снимаются RSS, число
+отложенных задач и гринлетов и размеры active_games / open_games / lobby_sids.
+После прогрева считается скорость роста каждой метрики; превышение порога — провал (код 1).
+Оценка роста надежна на прогонах от получаса; короткий прогон ловит утечки в основном
+финальной проверкой: после остановки клиентов комнаты, лобби и задачи должны опустеть.
+
+Игроки регистрируются (или входят) как soakNNN — без записи в БД сервер не открывает PvP комнаты.
+Сервер должен быть запущен с ADMIN_TOKEN. Нужен клиент: pip install "python-socketio[client]"
+
+    ADMIN_TOKEN=secret python misc/soak_test.py --duration 3600 --clients 16
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.request
+
+import socketio
+
+# Метрика -> ключ порога (КБ/мин для памяти, штук/мин для остального)
+METRICS = {'rss_kb': 'max_rss_growth', 'pending_tasks': 'max_count_growth', 'greenlets': 'max_count_growth',
+           'active_games': 'max_count_growth', 'open_games': 'max_count_growth', 'lobby_sids': 'max_count_growth'}
+LOBBY_WAIT = 20  # Сколько создатель PvP ждет соперника, с
+AUTH_WAIT = 10
+SOAK_PASSWORD = 'soak-password'
+# Эти размеры после остановки клиентов и паузы на дренаж должны вернуться к исходным
+DRAINED_METRICS = ('pending_tasks', 'active_games', 'open_games', 'lobby_sids')
+
+
+class VirtualPlayer:
+    """Один игрок: своя сессия Socket.IO и бесконечная череда игр со случайными действиями."""
+
+    def __init__(self, index, args, pvp_queue, counters, stop):
+        self.nickname = f"soak{index:03d}"
+        self.args, self.pvp_queue, self.counters, self.stop = args, pvp_queue, counters, stop
+        self.client, self.sid, self.room_id, self.last_state = None, None, None, None
+        self.game_started, self.game_done, self.room_listed = threading.Event(), threading.Event(), threading.Event()
+        self.authenticated, self.auth_error, self.pvp_started = threading.Event(), None, False
+
+    def count(self, name):
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def connect(self):
+        client = socketio.Client(reconnection=False)
+        client.on('turn_updated', self.on_turn)
+        client.on('guess_result', self.on_guess_result)
+        client.on('update_lobby', self.on_update_lobby)
+        client.on('round_summary', self.on_round_summary)
+        client.on('game_over', lambda data: self.finish('game_over'))
+        client.on('opponent_disconnected', lambda data: self.finish('opponent_disconnected'))
+        client.on('disconnect', lambda *a: self.game_done.set())
+        client.on('auth_status', self.on_auth_status)
+        client.connect(self.args.url, transports=['websocket'])
+        self.client, self.sid = client, client.get_sid()
+        self.count('connects')
+        # Без записи в БД сервер не откроет PvP комнату — входим до первой игры
+        self.authenticated.clear()
+        self.auth_error = None
+        self.send('register_user', {'nickname': self.nickname, 'password': SOAK_PASSWORD})
+        if not self.authenticated.wait(AUTH_WAIT) or self.auth_error:
+            self.count('auth_failures')
+            raise RuntimeError(f"вход не удался: {self.auth_error or 'нет ответа auth_status'}")
+
+    def on_auth_status(self, data):
+        if data.get('success'):
+            self.authenticated.set()
+        elif data.get('form') == 'register':
+            # Никнейм остался с прошлого прогона или переподключения — входим с тем же паролем
+            self.send('login_user', {'nickname': self.nickname, 'password': SOAK_PASSWORD})
+        else:
+            self.auth_error = data.get('message')
+            self.authenticated.set()
+
+    def disconnect(self):
+        self.unlist()
+        # Сначала забываем клиента: событие disconnect будит основной цикл, и он должен подключиться заново
+        client, self.client = self.client, None
+        if client and client.connected: client.disconnect()
+        self.count('disconnects')
+
+    def unlist(self):
+        """Убирает свою комнату из очереди; False — ее уже забрал другой игрок."""
+        try:
+            self.pvp_queue.remove(self.sid)
+            return True
+        except ValueError:
+            return False
+
+    def send(self, event, data=None):
+        # Обработчики событий клиента работают в своем потоке и могут оборвать связь раньше нас
+        client = self.client
+        if not client: return
+        try:
+            client.emit(event, data)
+        except socketio.exceptions.BadNamespaceError:
+            self.count('emits_after_disconnect')
+
+    def finish(self, reason):
+        self.count(reason)
+        self.game_done.set()
+
+    def maybe_disconnect(self, probability):
+        # Обрыв связи посреди игры или ожидания в лобби — основной источник «брошенных» комнат
+        if random.random() < probability:
+            self.disconnect()
+            self.game_done.set()
+            return True
+        return False
+
+    def on_update_lobby(self, rooms):
+        if any(r['creator_sid'] == self.sid for r in rooms): self.room_listed.set()
+
+    def on_turn(self, state):
+        self.room_id = state['roomId']
+        if state.get('mode') == 'pvp' and not self.pvp_started:
+            self.pvp_started = True
+            self.count('pvp_games')
+        self.game_started.set()
+        me = next((i for i, p in state['players'].items() if p['nickname'] == self.nickname), None)
+        if me is None or str(state['currentPlayerIndex']) != me: return
+        if self.maybe_disconnect(self.args.disconnect_rate): return
+        self.act(state)
+
+    def act(self, state):
+        time.sleep(random.uniform(0.05, self.args.think_time))
+        if not self.client: return
+        named = {p['full_name'] for p in state.get('namedPlayers', []) if 'full_name' in p}
+        unnamed = [name for name in state['fullPlayerList'] if name not in named]
+        roll = random.random()
+        if roll < 0.05:
+            self.count('idle_turns')  # Пусть истечет банк времени: проверка turn_watcher
+            return
+        if roll < 0.12 or not unnamed:
+            self.count('surrenders')
+            self.send('surrender_round', {'roomId': self.room_id})
+            return
+        surname = random.choice(unnamed).split()[-1]
+        if roll < 0.3 and len(surname) > 4:
+            pos = random.randrange(1, len(surname) - 1)
+            surname = surname[:pos] + surname[pos + 1:]  # Опечатка: пропущена буква
+            self.count('typos')
+        elif roll < 0.4:
+            surname = random.choice(['Иванов', 'Смит', 'qwerty', 'Месси'])
+            self.count('wrong_guesses')
+        self.last_state = state
+        self.send('submit_guess', {'roomId': self.room_id, 'guess': surname})
+
+    def on_guess_result(self, data):
+        # Неверный ответ — ход все еще наш, пробуем снова
+        if data.get('result') not in ('correct', 'correct_typo') and self.last_state:
+            self.act(self.last_state)
+
+    def on_round_summary(self, data):
+        if self.maybe_disconnect(self.args.disconnect_rate): return
+        if self.client and random.random() < 0.7:
+            self.count('skip_votes')
+            self.send('request_skip_pause', {'roomId': self.room_id})
+
+    def play_once(self):
+        if not self.client: self.connect()
+        for event in (self.game_started, self.game_done, self.room_listed): event.clear()
+        self.room_id, self.last_state, self.pvp_started = None, None, False
+        settings = {'num_rounds': random.randint(1, self.args.rounds), 'time_bank': self.args.time_bank}
+        if random.random() < 0.4:
+            self.count('solo_games')
+            self.send('start_game', {'mode': 'solo', 'nickname': self.nickname, 'settings': settings})
+        else:
+            try:
+                creator_sid = self.pvp_queue.pop()
+            except IndexError:
+                creator_sid = None
+            if creator_sid:
+                self.count('pvp_joins')
+                self.send('join_game', {'creator_sid': creator_sid, 'nickname': self.nickname})
+            else:
+                self.count('pvp_creates')
+                self.send('create_game', {'nickname': self.nickname, 'settings': settings})
+                # В очередь попадаем только когда комната уже видна в лобби
+                if not self.room_listed.wait(10):
+                    self.count('create_failures')  # Сервер молча не открыл комнату — это ошибка, а не ожидание
+                    return
+                self.pvp_queue.append(self.sid)
+                if self.maybe_disconnect(self.args.disconnect_rate): return
+        if not self.game_started.wait(LOBBY_WAIT) and not self.game_done.is_set():
+            # Соперник мог забрать комнату из очереди в последний момент — тогда партия вот-вот начнется
+            taken = self.room_listed.is_set() and not self.unlist()
+            if not (taken and self.game_started.wait(LOBBY_WAIT)):
+                self.count('lobby_timeouts')
+                self.leave_lobby()
+                return
+        # Партия должна закончиться за отведенное время; иначе бросаем ее и идем дальше
+        limit = self.args.rounds * (2 * self.args.time_bank + 12) + 10
+        if not self.game_done.wait(limit):
+            self.count('abandoned_games')
+            self.disconnect()
+
+    def leave_lobby(self):
+        self.unlist()
+        self.send('cancel_game')
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                self.play_once()
+            except Exception as e:
+                self.count('client_errors')
+                print(f"[SOAK] {self.nickname}: {e}")
+                self.disconnect()
+                time.sleep(1)
+        self.disconnect()
+
+
+def fetch_admin_report(args):
+    request = urllib.request.Request(f"{args.url}/admin/rooms?greenlets=1", headers={'X-Admin-Token': args.token})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        report = json.load(response)
+    sample = dict(report['totals'])
+    sample['greenlets'] = sum(report.get('greenlets', {}).values())
+    sample['t'] = time.time()
+    return sample
+
+
+def growth_per_minute(samples, key, window):
+    """
+    Рост «пола» метрики за минуту: минимум в каждом окне из window замеров, затем наклон МНК по этим минимумам.
+    Размеры комнат и число задач сильно скачут вместе с нагрузкой, но минимум по окну от нагрузки почти не зависит,
+    а утечка поднимает его от окна к окну.
+    """
+    floors = [(statistics.mean(s['t'] for s in chunk) / 60, min(s[key] for s in chunk))
+              for chunk in (samples[i:i + window] for i in range(0, len(samples) - window + 1, window))]
+    if len(floors) < 2: return 0.0
+    mean_x, mean_y = statistics.mean(x for x, _ in floors), statistics.mean(y for _, y in floors)
+    variance = sum((x - mean_x) ** 2 for x, _ in floors)
+    return sum((x - mean_x) * (y - mean_y) for x, y in floors) / variance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-прогон сервера со случайными игровыми сценариями и проверкой утечек.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--token', default=os.environ.get('ADMIN_TOKEN'), help="ADMIN_TOKEN сервера (по умолчанию из окружения)")
+    parser.add_argument('--duration', type=float, default=1800, help="Длительность прогона, с")
+    parser.add_argument('--warmup', type=float, default=None, help="Прогрев, не учитываемый в оценке роста, с (по умолчанию 20%% длительности)")
+    parser.add_argument('--interval', type=float, default=10, help="Период снятия метрик, с")
+    parser.add_argument('--window', type=int, default=6, help="Замеров в окне, по которому берется минимум метрики")
+    parser.add_argument('--clients', type=int, default=8, help="Число одновременных виртуальных игроков")
+    parser.add_argument('--rounds', type=int, default=3, help="Максимум раундов в одной игре")
+    parser.add_argument('--time-bank', type=float, default=8.0, help="Банк времени игрока, с")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Максимальная задержка перед ответом, с")
+    parser.add_argument('--disconnect-rate', type=float, default=0.03, help="Вероятность обрыва связи на каждом ходу")
+    parser.add_argument('--max-rss-growth', type=float, default=1024, help="Допустимый рост RSS после прогрева, КБ/мин")
+    parser.add_argument('--max-count-growth', type=float, default=1.0, help="Допустимый рост размеров и числа задач, шт/мин")
+    parser.add_argument('--drain', type=float, default=None, help="Ожидание после остановки клиентов перед финальной проверкой, с")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if not args.token: parser.error("нужен --token или ADMIN_TOKEN")
+    if args.seed is not None: random.seed(args.seed)
+    warmup = args.duration * 0.2 if args.warmup is None else args.warmup
+    drain = args.drain if args.drain is not None else 2 * args.time_bank + 15
+
+    baseline = fetch_admin_report(args)
+    print(f"[SOAK] Старт: {args.clients} клиентов, {args.duration:.0f} c, прогрев {warmup:.0f} c. Исходно: "
+          + ", ".join(f"{k}={baseline[k]}" for k in METRICS))
+    stop, pvp_queue, counters = threading.Event(), [], {}
+    players = [VirtualPlayer(i, args, pvp_queue, counters, stop) for i in range(args.clients)]
+    threads = [threading.Thread(target=p.run, daemon=True) for p in players]
+    for thread in threads: thread.start()
+
+    started_at, samples = time.time(), []
+    while time.time() - started_at < args.duration:
+        time.sleep(args.interval)
+        sample = fetch_admin_report(args)
+        samples.append(sample)
+        print(f"[SOAK] {sample['t'] - started_at:6.0f} c: " + ", ".join(f"{k}={sample[k]}" for k in METRICS))
+
+    stop.set()
+    for player in players:
+        player.game_done.set()
+    for thread in threads: thread.join(timeout=args.think_time + 30)
+    time.sleep(drain)
+    final = fetch_admin_report(args)
+
+    failures = []
+    measured = [s for s in samples if s['t'] - started_at >= warmup]
+    print(f"[SOAK] Действия клиентов: {dict(sorted(counters.items()))}")
+    print(f"[SOAK] Рост после прогрева ({len(measured)} замеров):")
+    for key, limit_name in METRICS.items():
+        rate, limit = growth_per_minute(measured, key, args.window), getattr(args, limit_name)
+        status = 'OK' if rate <= limit else 'ПРОВАЛ'
+        if rate > limit: failures.append(f"{key} растет на {rate:.2f}/мин (порог {limit})")
+        print(f"  {key:<14} {rate:>10.2f}/мин  порог {limit:<8} {status}")
+    # Без PvP партий проверка не покрывает голосования за паузу и обрывы посреди партии
+    if counters.get('create_failures') or counters.get('auth_failures'):
+        failures.append(f"ошибки клиентов: create_failures={counters.get('create_failures', 0)}, auth_failures={counters.get('auth_failures', 0)}")
+    if counters.get('pvp_creates') and not counters.get('pvp_games'):
+        failures.append("ни одна PvP партия не началась")
+    for key in DRAINED_METRICS:
+        if final[key] > baseline[key]:
+            failures.append(f"{key}: после остановки клиентов {final[key]}, исходно {baseline[key]}")
+    print("[SOAK] После дренажа: " + ", ".join(f"{k}={final[k]}" for k in METRICS))
+
+    if failures:
+        print("[SOAK] ПРОВАЛ:\n  " + "\n  ".join(failures))
+        return 1
+    print("[SOAK] Утечек не обнаружено.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
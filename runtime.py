@@ -0,0 +1,231 @@
+# runtime.py
+#
+# Два варианта окружения для игрового сервера с одинаковым интерфейсом:
+#   - EventletRuntime: Flask-SocketIO поверх eventlet (как раньше, gunicorn --worker-class eventlet);
+#   - AsyncioRuntime: python-socketio AsyncServer под ASGI-сервером (uvicorn asgi:app).
+# Игровая логика в server.py не спит и не блокируется сама: таймеры ставятся через call_later,
+# работа с БД уходит в run_blocking, а результат (или ошибка) возвращается колбэком.
+
+import asyncio
+import collections
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+from socket_trace import TraceRecorder
+
+DB_THREADS = 4
+
+
+class BaseRuntime:
+    """Общая часть: необязательная запись трассы (SOCKET_TRACE) на входе и выходе Socket.IO."""
+    tracer = None
+
+    def traced(self, event, handler):
+        if not self.tracer: return handler
+        tracer, arity = self.tracer, len(inspect.signature(handler).parameters)
+        @functools.wraps(handler)
+        def wrapper(*args):
+            # Лишние аргументы (auth у connect, reason у disconnect) обработчикам не нужны
+            args = args[:arity]
+            sid = flask.request.sid
+            started_at = tracer.begin(sid)
+            try: return handler(*args)
+            finally: tracer.inbound(sid, event, args[0] if args else None, started_at)
+        return wrapper
+
+    def trace_emit(self, event, data, to):
+        if self.tracer: self.tracer.outbound(event, data, to)
+
+    def trace_room(self, kind, sid, room):
+        if self.tracer: self.tracer.room_change(kind, sid, room)
+
+    def blocking_failed(self, fn, error, on_error):
+        # Одинаково в обоих окружениях: ошибку получает on_error, без него она только пишется в лог
+        if on_error: on_error(error)
+        else: print(f"[RUNTIME] Ошибка в {getattr(fn, '__name__', fn)}: {error!r}")
+
+
+class EventletRuntime(BaseRuntime):
+    name = 'eventlet'
+
+    def __init__(self, flask_app):
+        from flask_socketio import SocketIO
+        self.flask_app = flask_app
+        self.socketio = SocketIO(flask_app, async_mode='eventlet', cors_allowed_origins="*")
+
+    def on(self, event):
+        def decorator(handler):
+            self.socketio.on(event)(self.traced(event, handler))
+            return handler
+        return decorator
+
+    def emit(self, event, data=None, to=None):
+        self.trace_emit(event, data, to)
+        args = () if data is None else (data,)
+        self.socketio.emit(event, *args, to=to)
+
+    def enter_room(self, sid, room):
+        self.trace_room('j', sid, room)
+        self.socketio.server.enter_room(sid, room, namespace='/')
+
+    def leave_room(self, sid, room):
+        self.trace_room('l', sid, room)
+        self.socketio.server.leave_room(sid, room, namespace='/')
+
+    def close_room(self, room):
+        if self.tracer: self.tracer.room_closed(room)
+        self.socketio.close_room(room)
+
+    def call_later(self, delay, fn, *args):
+        self.socketio.start_background_task(self._run_later, delay, fn, args)
+
+    def _run_later(self, delay, fn, args):
+        self.socketio.sleep(delay)
+        fn(*args)
+
+    def run_blocking(self, fn, callback, on_error=None):
+        # Под eventlet драйвер БД все равно блокирует хаб, поэтому выполняем сразу, как и раньше
+        try:
+            result = fn()
+        except Exception as e:
+            self.blocking_failed(fn, e, on_error)
+            return
+        callback(result)
+
+    def call_in_loop(self, fn):
+        # HTTP-обработчики работают в том же хабе, что и игра, — состояние можно читать напрямую
+        return fn()
+
+    def run_until(self, start, predicate, poll=0.05):
+        start()
+        while not predicate():
+            self.socketio.sleep(poll)
+
+    def run(self):
+        self.socketio.run(self.flask_app, debug=True)
+
+
+class AsyncioRuntime(BaseRuntime):
+    name = 'asyncio'
+
+    def __init__(self, flask_app):
+        import socketio as python_socketio
+        from asgiref.wsgi import WsgiToAsgi
+        from werkzeug.test import EnvironBuilder
+        self.flask_app = flask_app
+        self.sio = python_socketio.AsyncServer(async_mode='asgi', cors_allowed_origins="*")
+        socketio_app = python_socketio.ASGIApp(self.sio, other_asgi_app=WsgiToAsgi(flask_app))
+        self.loop = None
+        async def asgi_app(scope, receive, send):
+            # Запоминаем цикл событий: Flask-маршруты работают в потоках WsgiToAsgi и ходят в него за состоянием
+            self.loop = asyncio.get_running_loop()
+            await socketio_app(scope, receive, send)
+        self.asgi_app = asgi_app
+        self.executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='db')
+        # Все исходящие операции идут через одну очередь, чтобы сохранить порядок, как при синхронных emit
+        self.outbox, self.drainer = collections.deque(), None
+        self.base_environ = EnvironBuilder(path='/socket.io/').get_environ()
+
+    def on(self, event):
+        def decorator(handler):
+            traced_handler = self.traced(event, handler)
+            takes_data = len(inspect.signature(handler).parameters) > 0
+            if event == 'connect':
+                async def wrapper(sid, environ, auth=None):
+                    self._dispatch(sid, traced_handler, ())
+            elif event == 'disconnect':
+                async def wrapper(sid, reason=None):
+                    self._dispatch(sid, traced_handler, ())
+            else:
+                async def wrapper(sid, data=None):
+                    self._dispatch(sid, traced_handler, (data,) if takes_data else ())
+            self.sio.on(event, wrapper)
+            return handler
+        return decorator
+
+    def _dispatch(self, sid, handler, args):
+        # Обработчики написаны под Flask-SocketIO и читают request.sid — даем им такой же контекст
+        with self.flask_app.request_context(dict(self.base_environ)):
+            flask.request.sid, flask.request.namespace = sid, '/'
+            handler(*args)
+
+    def _push(self, operation):
+        self.outbox.append(operation)
+        if self.drainer is None or self.drainer.done():
+            self.drainer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while self.outbox:
+            kind, *args = self.outbox.popleft()
+            try:
+                if kind == 'emit':
+                    event, data, to = args
+                    await self.sio.emit(event, data, to=to)
+                elif kind == 'enter':
+                    await self.sio.enter_room(args[0], args[1])
+                elif kind == 'leave':
+                    await self.sio.leave_room(args[0], args[1])
+                elif kind == 'close':
+                    await self.sio.close_room(args[0])
+            except Exception as e:
+                print(f"[RUNTIME] Ошибка при отправке {kind}: {e}")
+
+    def emit(self, event, data=None, to=None):
+        self.trace_emit(event, data, to)
+        self._push(('emit', event, data, to))
+
+    def enter_room(self, sid, room):
+        self.trace_room('j', sid, room)
+        self._push(('enter', sid, room))
+
+    def leave_room(self, sid, room):
+        self.trace_room('l', sid, room)
+        self._push(('leave', sid, room))
+
+    def close_room(self, room):
+        if self.tracer: self.tracer.room_closed(room)
+        self._push(('close', room))
+
+    def call_later(self, delay, fn, *args):
+        asyncio.get_running_loop().call_later(delay, fn, *args)
+
+    def run_blocking(self, fn, callback, on_error=None):
+        """fn выполняется в пуле потоков, callback или on_error — снова в цикле событий."""
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                self.blocking_failed(fn, e, on_error)
+                return
+            callback(result)
+        asyncio.get_running_loop().run_in_executor(self.executor, fn).add_done_callback(done)
+
+    def call_in_loop(self, fn, timeout=30):
+        """Выполняет fn в цикле событий и ждет результат: игровые словари меняются только там."""
+        if self.loop is None: return fn()
+        async def call(): return fn()
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result(timeout)
+
+    def run_until(self, start, predicate, poll=0.05):
+        async def main():
+            start()
+            while not predicate():
+                await asyncio.sleep(poll)
+        asyncio.run(main())
+
+    def run(self):
+        import uvicorn
+        uvicorn.run(self.asgi_app, host='127.0.0.1', port=5000)
+
+
+def create_runtime(name, flask_app, trace_path=None):
+    runtimes = {'eventlet': EventletRuntime, 'asyncio': AsyncioRuntime}
+    if name not in runtimes:
+        raise ValueError(f"Неизвестный RPL_RUNTIME: {name}")
+    runtime = runtimes[name](flask_app)
+    # Трасса включается до регистрации обработчиков, иначе они не будут обернуты
+    if trace_path: runtime.tracer = TraceRecorder(trace_path)
+    return runtime
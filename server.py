@@ -1,17 +1,37 @@
 # server.py
 
-import os, csv, uuid, random, time, re
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
+import os, sys, csv, uuid, random, time, re, gzip, hashlib, mimetypes, math, gc, hmac, tracemalloc, functools, collections
+import greenlet
+from flask import Flask, render_template, request, Response, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from fuzzywuzzy import fuzz
 from glicko2 import Player
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.pool import NullPool
 from werkzeug.security import generate_password_hash, check_password_hash
+from runtime import create_runtime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Константы
 PAUSE_BETWEEN_ROUNDS = 10
 TYPO_THRESHOLD = 85
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SHELL_CACHE_CONTROL = 'no-cache'
+SPECTATOR_SNAPSHOT_INTERVAL = 1.0
+BOT_TURN_DELAY = 3.0
+TOURNAMENT_START_BATCH = 50
+TOURNAMENT_MAX_ROUNDS = 20
+TOURNAMENT_RETENTION = 600  # Сколько завершенный турнир остается в списке, с
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+TRACEMALLOC_TOP = 25
+FINALIZE_ATTEMPTS = 3
+FINALIZE_RETRY_DELAY = 2.0
+FINALIZE_STATS_WINDOW = 500
+LEADERBOARD_SIZE = 100
 
 # Настройка Flask, SQLAlchemy
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -25,7 +45,9 @@ else:
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = { 'poolclass': NullPool }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
-socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins="*")
+# eventlet (по умолчанию, gunicorn) или asyncio (uvicorn asgi:app), см. runtime.py
+# SOCKET_TRACE=путь включает запись обезличенной трассы входящих событий (см. socket_trace.py)
+runtime = create_runtime(os.environ.get('RPL_RUNTIME', 'eventlet'), app, trace_path=os.environ.get('SOCKET_TRACE'))
 
 # Модель Базы Данных
 class User(db.Model):
@@ -36,22 +58,66 @@ class User(db.Model):
     rd = db.Column(db.Float, default=350)
     vol = db.Column(db.Float, default=0.06)
 
+class GameResult(db.Model):
+    """История PvP партий. room_id — ключ идемпотентности: партия попадает в рейтинг ровно один раз."""
+    room_id = db.Column(db.String(64), primary_key=True)
+    p1_nickname = db.Column(db.String(80), nullable=False)
+    p2_nickname = db.Column(db.String(80), nullable=False)
+    p1_score = db.Column(db.Float, nullable=False)
+    p2_score = db.Column(db.Float, nullable=False)
+    p1_rating_before = db.Column(db.Float, nullable=False)
+    p1_rating_after = db.Column(db.Float, nullable=False)
+    p2_rating_before = db.Column(db.Float, nullable=False)
+    p2_rating_after = db.Column(db.Float, nullable=False)
+    finished_at = db.Column(db.Float, default=time.time)
+
+    def rating_changes(self):
+        return {'p1': {'old': int(self.p1_rating_before), 'new': int(self.p1_rating_after)},
+                'p2': {'old': int(self.p2_rating_before), 'new': int(self.p2_rating_after)}}
+
 with app.app_context():
     db.create_all()
 
 # Глобальные переменные для отслеживания состояния
 active_games, open_games = {}, {}
+# Задержки конца PvP игры: до отправки game_over и транзакции с рейтингами (мс)
+finalize_stats = {'games': 0, 'duplicates': 0, 'retries': 0, 'failures': 0, 'corrections': 0,
+                  'game_over_ms': collections.deque(maxlen=FINALIZE_STATS_WINDOW), 'commit_ms': collections.deque(maxlen=FINALIZE_STATS_WINDOW)}
 lobby_sids = set()
+# Зрители живут отдельно от игровых сессий и не влияют на ход игры
+spectator_channels, spectator_sid_rooms = {}, {}
+tournaments = {}
+running_tasks = {}  # имя функции фоновой задачи -> сколько таких задач живо сейчас
 
 # --- НАЧАЛО БЛОКА ДЛЯ ВСТАВКИ ---
 
+def get_or_create_user(nickname, password=None):
+    """Игрок по никнейму; новый создается с рейтингом по умолчанию. Вызывать внутри app_context."""
+    user = User.query.filter_by(nickname=nickname).first()
+    if user: return user
+    user = User(nickname=nickname, password_hash=generate_password_hash(password) if password else None,
+                rating=1500, rd=350, vol=0.06)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Того же игрока параллельно создал другой поток пула БД
+        db.session.rollback()
+        user = User.query.filter_by(nickname=nickname).first()
+    return user
+
+def get_leaderboard_data():
+    """Лучшие игроки по рейтингу в формате клиента. Вызывать внутри app_context."""
+    users = User.query.order_by(User.rating.desc()).limit(LEADERBOARD_SIZE).all()
+    return [{'nickname': user.nickname, 'rating': int(user.rating)} for user in users]
+
 def broadcast_lobby_stats():
     """Отправляет всем клиентам актуальное количество игроков."""
     stats = {
         'players_in_lobby': len(lobby_sids),
         'players_in_game': sum(len(g['game'].players) for g in active_games.values())
     }
-    socketio.emit('lobby_stats_update', stats)
+    runtime.emit('lobby_stats_update', stats)
 
 def add_player_to_lobby(sid):
     """Добавляет игрока в лобби и оповещает всех."""
@@ -79,8 +145,97 @@ def is_player_busy(sid):
             return True
     return False
 
+def new_game_session(game, **extra):
+    """Сессия игры вместе с дешевыми счетчиками для /admin/rooms."""
+    return {'game': game, 'turn_id': None, 'pause_id': None, 'skip_votes': set(),
+            'created_at': time.time(), 'events': 0, 'tasks_started': 0, 'tasks_pending': 0, **extra}
+
+def emit(event, data=None, to=None, room=None):
+    """Ответ в обработчике события: по умолчанию тому, кто его прислал."""
+    runtime.emit(event, data, to=to or room or request.sid)
+
+def join_room(room, sid=None): runtime.enter_room(sid or request.sid, room)
+def leave_room(room, sid=None): runtime.leave_room(sid or request.sid, room)
+
+def emit_to_room(room_id, event, data):
+    game_session = active_games.get(room_id)
+    if game_session: game_session['events'] += 1
+    runtime.emit(event, data, to=room_id)
+
+def start_tracked_task(target, *args, room_id=None, delay=0):
+    """Запускает target через delay секунд и ведет учет ожидающих задач по функциям и по комнатам."""
+    game_session = active_games.get(room_id) if room_id else None
+    if game_session:
+        game_session['tasks_started'] += 1
+        game_session['tasks_pending'] += 1
+    name = target.__name__
+    running_tasks[name] = running_tasks.get(name, 0) + 1
+    @functools.wraps(target)
+    def run(*run_args):
+        try: target(*run_args)
+        finally:
+            running_tasks[name] -= 1
+            if game_session: game_session['tasks_pending'] -= 1
+    runtime.call_later(delay, run, *args)
+
 # --- КОНЕЦ БЛОКА ДЛЯ ВСТАВКИ ---
 
+# --- Транслитерация и фонетические ключи для поиска по латинице ---
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya'
+}
+# Порядок важен: сначала длинные сочетания, потом одиночные буквы
+PHONETIC_REPLACEMENTS = (
+    ('shch', 's'), ('sch', 's'), ('tch', 'c'), ('sh', 's'), ('zh', 'z'), ('kh', 'h'), ('ch', 'c'),
+    ('tz', 'c'), ('ts', 'c'), ('ck', 'k'), ('ph', 'f'), ('w', 'v'), ('x', 'ks'), ('q', 'k'),
+    ('yu', 'u'), ('ju', 'u'), ('iu', 'u'), ('ya', 'a'), ('ja', 'a'), ('ia', 'a'),
+    ('ye', 'e'), ('je', 'e'), ('yo', 'o'), ('jo', 'o'), ('j', 'y'), ('y', 'i'), ('o', 'a')
+)
+CYRILLIC_RE = re.compile('[а-яё]')
+NON_LETTERS_RE = re.compile('[^a-z]')
+REPEATED_LETTERS_RE = re.compile(r'(.)\1+')
+
+def transliterate(text):
+    """Кириллица -> латиница по упрощенной схеме; остальные символы не меняются."""
+    return ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text.lower())
+
+def translit_key(text):
+    return NON_LETTERS_RE.sub('', transliterate(text))
+
+def phonetic_key(text):
+    """Грубый фонетический ключ: сводит разные латинские написания одной фамилии к одной строке."""
+    key = translit_key(text)
+    for source, target in PHONETIC_REPLACEMENTS:
+        key = key.replace(source, target)
+    key = REPEATED_LETTERS_RE.sub(r'\1', key)
+    if key.endswith('v'): key = key[:-1] + 'f'
+    return key
+
+def build_alias_index(player_objects):
+    """Для одного клуба: транслит/фонетический ключ -> игроки с таким псевдонимом."""
+    index = {'translit': {}, 'phonetic': {}}
+    for player_object in player_objects:
+        for alias in player_object['valid_normalized_names']:
+            for kind, key in (('translit', translit_key(alias)), ('phonetic', phonetic_key(alias))):
+                if not key: continue
+                players = index[kind].setdefault(key, [])
+                if player_object not in players: players.append(player_object)
+    return index
+
+def estimate_alias_index_size(index):
+    size = sys.getsizeof(index)
+    for table in index.values():
+        size += sys.getsizeof(table)
+        size += sum(sys.getsizeof(key) + sys.getsizeof(players) for key, players in table.items())
+    return size
+
+# Индексы псевдонимов по лигам и их стоимость: заполняются в load_league_data
+alias_indexes, alias_index_stats = {}, {}
+
 def load_league_data(filename, league_name):
     """Загружает данные для одной лиги."""
     clubs_data = {}
@@ -101,11 +256,41 @@ def load_league_data(filename, league_name):
             }
             if club_name not in clubs_data: clubs_data[club_name] = []
             clubs_data[club_name].append(player_object)
+
+    build_started = time.perf_counter()
+    league_indexes = {club_name: build_alias_index(players) for club_name, players in clubs_data.items()}
+    alias_indexes[league_name] = league_indexes
+    alias_index_stats[league_name] = {
+        'keys': sum(len(table) for index in league_indexes.values() for table in index.values()),
+        'bytes': sum(estimate_alias_index_size(index) for index in league_indexes.values()),
+        'build_ms': (time.perf_counter() - build_started) * 1000
+    }
+    stats = alias_index_stats[league_name]
+    print(f"[DATA] Лига {league_name}: индекс транслитерации — {stats['keys']} ключей, ~{stats['bytes'] / 1024:.0f} КБ, построен за {stats['build_ms']:.1f} мс")
     return {league_name: clubs_data}
 
+EMPTY_ALIAS_INDEX = {'translit': {}, 'phonetic': {}}
+
+def build_club_fragments(leagues_data):
+    """Один раз готовит неизменяемые фрагменты клубов, общие для всех комнат."""
+    fragments = {}
+    for league_name, clubs_data in leagues_data.items():
+        league_fragments = {}
+        for club_name, player_objects in clubs_data.items():
+            sorted_players = tuple(sorted(player_objects, key=lambda p: p['primary_name']))
+            league_fragments[club_name] = {
+                'players': sorted_players,
+                'fullPlayerList': tuple(p['full_name'] for p in sorted_players),
+                'alias_index': alias_indexes.get(league_name, {}).get(club_name, EMPTY_ALIAS_INDEX)
+            }
+        fragments[league_name] = league_fragments
+    return fragments
+
 # Загружаем все лиги. В будущем можно будет добавить новые файлы.
 all_leagues_data = {}
 all_leagues_data.update(load_league_data('players.csv', 'РПЛ'))
+club_fragments = build_club_fragments(all_leagues_data)
+EMPTY_CLUB_FRAGMENT = {'players': (), 'fullPlayerList': (), 'alias_index': EMPTY_ALIAS_INDEX}
 
 
 class GameState:
@@ -120,6 +305,7 @@ class GameState:
         temp_settings = settings or {}
         league = temp_settings.get('league', 'РПЛ')
         self.all_clubs_data = all_leagues.get(league, {})
+        self.club_fragments = club_fragments.get(league, {})
         
         # Динамически задаем количество раундов по умолчанию
         max_clubs_in_league = len(self.all_clubs_data)
@@ -146,6 +332,10 @@ class GameState:
         self.current_round = -1
         self.current_player_index, self.current_club_name = 0, None
         self.players_for_comparison, self.named_players_full_names, self.named_players = [], set(), []
+        self.club_fragment = EMPTY_CLUB_FRAGMENT
+        # Никнеймы и sid не меняются в течение игры — собираем их для клиента один раз
+        self.players_for_client = {i: {'nickname': p['nickname'], 'sid': p['sid']} for i, p in self.players.items()}
+        self.nicknames_for_client = {i: {'nickname': p['nickname']} for i, p in self.players.items()}
         self.round_history, self.end_reason = [], 'normal'
         self.last_successful_guesser_index, self.previous_round_loser_index = None, None
         
@@ -172,8 +362,9 @@ class GameState:
             self.time_banks[1] = time_bank_setting
 
         self.current_club_name = self.game_clubs[self.current_round]
-        player_objects = self.all_clubs_data.get(self.current_club_name, [])
-        self.players_for_comparison = sorted(player_objects, key=lambda p: p['primary_name'])
+        # Состав клуба уже отсортирован при загрузке лиги и общий для всех комнат
+        self.club_fragment = self.club_fragments.get(self.current_club_name, EMPTY_CLUB_FRAGMENT)
+        self.players_for_comparison = self.club_fragment['players']
         self.named_players_full_names, self.named_players = set(), []
         return True
 
@@ -183,6 +374,23 @@ class GameState:
         for player_data in self.players_for_comparison:
             if guess_norm in player_data['valid_normalized_names'] and player_data['full_name'] not in self.named_players_full_names:
                 return {'result': 'correct', 'player_data': player_data}
+        # Точное совпадение с уже названным игроком важнее похожих фамилий других игроков клуба
+        for player_data in self.players_for_comparison:
+            if guess_norm in player_data['valid_normalized_names']:
+                return {'result': 'already_named'}
+
+        if not CYRILLIC_RE.search(guess_norm):
+            # Латиница и фонетические написания — поиск по готовому индексу вместо нечеткого перебора.
+            # Решает самый точный уровень, где нашлось совпадение: грубый ключ не должен отдать ответ другому игроку
+            alias_index = self.club_fragment['alias_index']
+            for kind, key in (('translit', translit_key(guess_norm)), ('phonetic', phonetic_key(guess_norm))):
+                matches = alias_index[kind].get(key)
+                if not matches: continue
+                for player_data in matches:
+                    if player_data['full_name'] not in self.named_players_full_names:
+                        return {'result': 'correct_typo', 'player_data': player_data}
+                return {'result': 'already_named'}
+            return {'result': 'not_found'}
 
         best_match_player, max_ratio = None, 0
         for player_data in self.players_for_comparison:
@@ -194,10 +402,6 @@ class GameState:
         
         if max_ratio >= TYPO_THRESHOLD:
             return {'result': 'correct_typo', 'player_data': best_match_player}
-        
-        for player_data in self.players_for_comparison:
-             if guess_norm in player_data['valid_normalized_names']:
-                 return {'result': 'already_named'}
 
         return {'result': 'not_found'}
 
@@ -228,10 +432,10 @@ class GameState:
 def get_game_state_for_client(game, room_id):
     return { 
         'roomId': room_id, 'mode': game.mode, 
-        'players': {i: {'nickname': p['nickname'], 'sid': p['sid']} for i, p in game.players.items()}, 
+        'players': game.players_for_client, 
         'scores': game.scores, 'round': game.current_round + 1, 'totalRounds': game.num_rounds, 
         'clubName': game.current_club_name, 'namedPlayers': game.named_players, 
-        'fullPlayerList': [p['full_name'] for p in game.players_for_comparison], 
+        'fullPlayerList': game.club_fragment['fullPlayerList'], 
         'currentPlayerIndex': game.current_player_index, 'timeBanks': game.time_banks 
     }
 
@@ -244,12 +448,26 @@ def start_next_human_turn(room_id):
     game_session['turn_id'] = turn_id
     time_left = game.time_banks[game.current_player_index]
     if time_left > 0:
-        socketio.start_background_task(turn_watcher, room_id, turn_id, time_left)
+        start_tracked_task(turn_watcher, room_id, turn_id, room_id=room_id, delay=time_left)
     else: on_timer_end(room_id)
-    socketio.emit('turn_updated', get_game_state_for_client(game, room_id), room=room_id)
+    emit_to_room(room_id, 'turn_updated', get_game_state_for_client(game, room_id))
+    notify_spectators(room_id, 'turn')
+    if game.players[game.current_player_index]['sid'] == 'BOT' and time_left > 0:
+        start_tracked_task(bot_turn_watcher, room_id, turn_id, room_id=room_id, delay=game_session.get('bot_turn_delay', BOT_TURN_DELAY))
 
-def turn_watcher(room_id, turn_id, time_limit):
-    socketio.sleep(time_limit)
+def bot_turn_watcher(room_id, turn_id):
+    """Бот отвечает верно с вероятностью skill, иначе сдается."""
+    game_session = active_games.get(room_id)
+    if not game_session or game_session.get('turn_id') != turn_id: return
+    game = game_session['game']
+    bot_info = game.players[game.current_player_index]
+    unnamed = [p for p in game.players_for_comparison if p['full_name'] not in game.named_players_full_names]
+    if unnamed and random.random() < bot_info.get('skill', 0.8):
+        apply_guess(room_id, random.choice(unnamed)['primary_name'], 'BOT')
+    else:
+        apply_surrender(room_id)
+
+def turn_watcher(room_id, turn_id):
     game_session = active_games.get(room_id)
     if game_session and game_session.get('turn_id') == turn_id: on_timer_end(room_id)
 
@@ -259,7 +477,8 @@ def on_timer_end(room_id):
     game = game_session['game']
     loser_index = game.current_player_index
     game.time_banks[loser_index] = 0.0
-    socketio.emit('timer_expired', {'playerIndex': loser_index, 'timeBanks': game.time_banks}, room=room_id)
+    emit_to_room(room_id, 'timer_expired', {'playerIndex': loser_index, 'timeBanks': game.time_banks})
+    notify_spectators(room_id, 'turn')
     if game.mode != 'solo':
         winner_index = 1 - loser_index
         game.scores[winner_index] += 1
@@ -274,50 +493,137 @@ def start_game_loop(room_id):
     if not game_session: return
     game = game_session['game']
     if not game.start_new_round():
-        game_over_data = { 'final_scores': game.scores, 'players': {i: {'nickname': p['nickname']} for i, p in game.players.items()}, 'history': game.round_history, 'mode': game.mode, 'end_reason': game.end_reason }
+        ended_at = time.perf_counter()
+        game_over_data = { 'roomId': room_id, 'final_scores': game.scores, 'players': game.nicknames_for_client, 'history': game.round_history, 'mode': game.mode, 'end_reason': game.end_reason }
         print(f"[GAME] Игра в комнате {room_id} окончена. Причина: {game.end_reason}, Счет: {game.scores[0]}-{game.scores[1]}")
         
         for player_info in game.players.values():
             if player_info['sid'] != 'BOT' and game.mode == 'pvp':
                 add_player_to_lobby(player_info['sid'])
 
-        if game.mode == 'pvp':
-            with app.app_context():
-                p1_obj = User.query.filter_by(nickname=game.players[0]['nickname']).first()
-                p2_obj = User.query.filter_by(nickname=game.players[1]['nickname']).first()
-
-            if not p1_obj or not p2_obj:
-                print(f"[ERROR] Не удалось найти одного из игроков в БД в конце игры {room_id}. Рейтинги не будут обновлены.")
-            else:
-                p1_old_rating = int(p1_obj.rating)
-                p2_old_rating = int(p2_obj.rating)
-
-                if game.scores[0] > game.scores[1]: 
-                    update_ratings(winner_user_obj=p1_obj, loser_user_obj=p2_obj)
-                elif game.scores[1] > game.scores[0]: 
-                    update_ratings(winner_user_obj=p2_obj, loser_user_obj=p1_obj)
-
-                with app.app_context():
-                    updated_p1 = User.query.get(p1_obj.id)
-                    updated_p2 = User.query.get(p2_obj.id)
-                    p1_new_rating = int(updated_p1.rating)
-                    p2_new_rating = int(updated_p2.rating)
-
-                game_over_data['rating_changes'] = {
-                    'p1': {'old': p1_old_rating, 'new': p1_new_rating},
-                    'p2': {'old': p2_old_rating, 'new': p2_new_rating}
-                }
-                socketio.emit('leaderboard_data', get_leaderboard_data())
-            
-        del active_games[room_id]
+        if game_session.get('tournament_id'):
+            # Рейтинги турнирных партий обновляются одним пакетом в конце турнира
+            record_tournament_result(game_session['tournament_id'], room_id, game.scores)
+        elif game.mode == 'pvp':
+            # game_over уходит сразу из памяти, рейтинги записываются следом отдельной стадией
+            game_over_data['rating_changes'] = preview_rating_changes(game)
+        active_games.pop(room_id, None)
         broadcast_lobby_stats()
-        socketio.emit('game_over', game_over_data, room=room_id)
+        emit_to_room(room_id, 'game_over', game_over_data)
+        close_spectator_channel(room_id, 'spectator_game_over', game_over_data)
+        if game.mode == 'pvp' and not game_session.get('tournament_id'):
+            finalize_stats['game_over_ms'].append((time.perf_counter() - ended_at) * 1000)
+            nicknames = [game.players[0]['nickname'], game.players[1]['nickname']]
+            finalize_pvp_game(room_id, nicknames, dict(game.scores), game_over_data['rating_changes'])
         return
         
     print(f"[GAME] Комната {room_id}: начинается раунд {game.current_round + 1}/{game.num_rounds}. Клуб: {game.current_club_name}.")
-    socketio.emit('round_started', get_game_state_for_client(game, room_id), room=room_id)
+    emit_to_room(room_id, 'round_started', get_game_state_for_client(game, room_id))
+    notify_spectators(room_id, 'turn')
     start_next_human_turn(room_id)
 
+# --- Конец PvP игры: рейтинги и история одной транзакцией ---
+
+def get_pvp_outcome(scores):
+    """Исход для первого игрока; при ничьей рейтинги не меняются, как и раньше."""
+    if scores[0] > scores[1]: return 1.0
+    if scores[1] > scores[0]: return 0.0
+    return None
+
+def compute_glicko_pair(p1, p2, p1_outcome):
+    """Новые (rating, rd, vol) обоих игроков по одной партии; на входе значения до игры."""
+    if p1_outcome is None: return p1, p2
+    updated = []
+    for me, opponent, outcome in ((p1, p2, p1_outcome), (p2, p1, 1.0 - p1_outcome)):
+        glicko_player = Player(rating=me[0], rd=me[1], vol=me[2])
+        glicko_player.update_player([opponent[0]], [opponent[1]], [outcome])
+        updated.append((glicko_player.rating, glicko_player.rd, glicko_player.vol))
+    return tuple(updated)
+
+def preview_rating_changes(game):
+    """Изменения рейтингов по снимку, сделанному при старте игры, — без обращения к БД."""
+    snapshots = [game.players[i].get('rating_snapshot') for i in (0, 1)]
+    if not all(snapshots): return None
+    updated = compute_glicko_pair(snapshots[0], snapshots[1], get_pvp_outcome(game.scores))
+    return {'p1': {'old': int(snapshots[0][0]), 'new': int(updated[0][0])},
+            'p2': {'old': int(snapshots[1][0]), 'new': int(updated[1][0])}}
+
+def commit_game_result(room_id, nicknames, scores):
+    """
+    Блокирующая часть: оба игрока одним запросом, рейтинги и строка истории — одна транзакция.
+    Повтор с тем же room_id ничего не меняет. Возвращает (статус, изменения рейтингов, мс транзакции).
+    """
+    started_at = time.perf_counter()
+    with app.app_context():
+        try:
+            existing = db.session.get(GameResult, room_id)
+            if existing: return 'duplicate', existing.rating_changes(), 0.0
+            users = {u.nickname: u for u in User.query.filter(User.nickname.in_(nicknames)).with_for_update().all()}
+            if len(users) < 2: return 'missing', None, 0.0
+            p1, p2 = users[nicknames[0]], users[nicknames[1]]
+            before = ((p1.rating, p1.rd, p1.vol), (p2.rating, p2.rd, p2.vol))
+            after = compute_glicko_pair(before[0], before[1], get_pvp_outcome(scores))
+            (p1.rating, p1.rd, p1.vol), (p2.rating, p2.rd, p2.vol) = after
+            result = GameResult(room_id=room_id, p1_nickname=nicknames[0], p2_nickname=nicknames[1],
+                                p1_score=scores[0], p2_score=scores[1],
+                                p1_rating_before=before[0][0], p1_rating_after=after[0][0],
+                                p2_rating_before=before[1][0], p2_rating_after=after[1][0])
+            db.session.add(result)
+            db.session.commit()
+            return 'ok', result.rating_changes(), (time.perf_counter() - started_at) * 1000
+        except IntegrityError:
+            # Ту же партию параллельно записал другой вызов — берем его результат
+            db.session.rollback()
+            existing = db.session.get(GameResult, room_id)
+            return 'duplicate', existing.rating_changes() if existing else None, 0.0
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"[RATING] Комната {room_id}: ошибка транзакции: {e}")
+            return 'error', None, 0.0
+
+def finalize_pvp_game(room_id, nicknames, scores, shown_changes, attempt=1):
+    def done(outcome):
+        status, rating_changes, commit_ms = outcome
+        if status == 'error':
+            if attempt < FINALIZE_ATTEMPTS:
+                finalize_stats['retries'] += 1
+                start_tracked_task(finalize_pvp_game, room_id, nicknames, scores, shown_changes, attempt + 1, delay=FINALIZE_RETRY_DELAY * attempt)
+            else:
+                finalize_stats['failures'] += 1
+                print(f"[ERROR] Комната {room_id}: рейтинги не записаны после {attempt} попыток.")
+            return
+        if status == 'missing':
+            print(f"[ERROR] Не удалось найти одного из игроков в БД в конце игры {room_id}. Рейтинги не будут обновлены.")
+            return
+        if status == 'duplicate':
+            finalize_stats['duplicates'] += 1
+            return
+        finalize_stats['games'] += 1
+        finalize_stats['commit_ms'].append(commit_ms)
+        if rating_changes != shown_changes:
+            # Рейтинг в БД изменился за время игры (например, дозаписалась прошлая партия) — показываем записанное
+            finalize_stats['corrections'] += 1
+            print(f"[RATING] Комната {room_id}: показано {shown_changes}, записано {rating_changes}. Отправлено уточнение.")
+            runtime.emit('rating_changes_corrected', {'roomId': room_id, 'rating_changes': rating_changes}, to=room_id)
+        # Партия уже записана; без свежей таблицы лидеров лобби обновится при следующем get_leaderboard
+        runtime.run_blocking(load_leaderboard, lambda leaderboard: runtime.emit('leaderboard_data', leaderboard),
+                             on_error=lambda e: print(f"[ERROR] Комната {room_id}: таблица лидеров после партии не отправлена: {e}"))
+    runtime.run_blocking(lambda: commit_game_result(room_id, nicknames, scores), done,
+                         on_error=lambda e: done(('error', None, 0.0)))
+
+def load_leaderboard():
+    with app.app_context():
+        return get_leaderboard_data()
+
+def get_finalize_report():
+    def percentiles(values):
+        ordered = sorted(values)
+        if not ordered: return None
+        return {'p50': round(ordered[len(ordered) // 2], 2), 'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)}
+    return {'games': finalize_stats['games'], 'duplicates': finalize_stats['duplicates'], 'retries': finalize_stats['retries'],
+            'failures': finalize_stats['failures'], 'corrections': finalize_stats['corrections'], 'game_over_ms': percentiles(finalize_stats['game_over_ms']),
+            'commit_ms': percentiles(finalize_stats['commit_ms'])}
+
 def show_round_summary_and_schedule_next(room_id):
     game_session = active_games.get(room_id)
     if not game_session: return
@@ -336,52 +642,327 @@ def show_round_summary_and_schedule_next(room_id):
     game_session['last_round_end_player_nickname'] = None
 
     summary_data = { 
-        'clubName': game.current_club_name, 'fullPlayerList': [p['full_name'] for p in game.players_for_comparison],
-        'namedPlayers': game.named_players, 'players': {i: {'nickname': p['nickname']} for i, p in game.players.items()}, 
+        'clubName': game.current_club_name, 'fullPlayerList': game.club_fragment['fullPlayerList'],
+        'namedPlayers': game.named_players, 'players': game.nicknames_for_client, 
         'scores': game.scores, 'mode': game.mode 
     }
-    socketio.emit('round_summary', summary_data, room=room_id)
+    emit_to_room(room_id, 'round_summary', summary_data)
+    notify_spectators(room_id, 'summary')
     pause_id = f"pause_{room_id}_{game.current_round}"
     game_session['pause_id'] = pause_id
-    socketio.start_background_task(pause_watcher, room_id, pause_id)
+    start_tracked_task(pause_watcher, room_id, pause_id, room_id=room_id, delay=game_session.get('pause_between_rounds', PAUSE_BETWEEN_ROUNDS))
 
 def pause_watcher(room_id, pause_id):
-    socketio.sleep(PAUSE_BETWEEN_ROUNDS)
     game_session = active_games.get(room_id)
     if game_session and game_session.get('pause_id') == pause_id:
         print(f"[GAME] Комната {room_id}: пауза окончена, запуск следующего раунда.")
         start_game_loop(room_id)
 
-def get_lobby_data_list():
-    lobby_list = []
+# --- Зрители: отдельный канал с прореженными снимками состояния ---
+
+def get_spectator_room(room_id): return f"{room_id}_spectators"
+
+def build_spectator_snapshot(room_id, game, channel):
+    return {
+        'roomId': room_id, 'phase': channel['phase'], 'players': game.nicknames_for_client,
+        'scores': game.scores, 'round': game.current_round + 1, 'totalRounds': game.num_rounds,
+        'clubName': game.current_club_name, 'namedPlayers': game.named_players,
+        'fullPlayerList': game.club_fragment['fullPlayerList'],
+        'currentPlayerIndex': game.current_player_index, 'timeBanks': game.time_banks,
+        'turnElapsed': time.time() - game.turn_start_time if channel['phase'] == 'turn' else 0,
+        'spectators': len(channel['sids'])
+    }
+
+def notify_spectators(room_id, phase):
+    """Помечает снимок устаревшим. Для игроков это одна проверка словаря, рассылку делает отдельная задача."""
+    channel = spectator_channels.get(room_id)
+    if not channel: return
+    channel['phase'], channel['dirty'] = phase, True
+    if not channel['flusher_running']:
+        channel['flusher_running'] = True
+        delay = max(0.0, channel['last_sent'] + SPECTATOR_SNAPSHOT_INTERVAL - time.time())
+        start_tracked_task(spectator_snapshot_watcher, room_id, channel, room_id=room_id, delay=delay)
+
+def spectator_snapshot_watcher(room_id, channel):
+    """Склеивает все изменения за интервал в один снимок и рассылает его не чаще SPECTATOR_SNAPSHOT_INTERVAL."""
+    # Канал закрыт (или пересоздан новыми зрителями со своей задачей) — эта цепочка заканчивается
+    game_session = active_games.get(room_id)
+    if spectator_channels.get(room_id) is not channel or not game_session: return
+    if not channel['dirty'] or not channel['sids']:
+        channel['flusher_running'] = False
+        return
+    channel['dirty'], channel['last_sent'] = False, time.time()
+    runtime.emit('spectator_snapshot', build_spectator_snapshot(room_id, game_session['game'], channel), to=get_spectator_room(room_id))
+    # Следующая проверка не раньше чем через интервал; если изменений не будет, задача завершится
+    start_tracked_task(spectator_snapshot_watcher, room_id, channel, room_id=room_id, delay=SPECTATOR_SNAPSHOT_INTERVAL)
+
+def remove_spectator(sid):
+    room_id = spectator_sid_rooms.pop(sid, None)
+    if not room_id: return
+    leave_room(get_spectator_room(room_id), sid=sid)
+    channel = spectator_channels.get(room_id)
+    if channel:
+        channel['sids'].discard(sid)
+        if not channel['sids']: del spectator_channels[room_id]
+    print(f"[SPECTATE] Зритель {sid} покинул комнату {room_id}.")
+
+def close_spectator_channel(room_id, event, data):
+    """Отправляет зрителям финальное событие и закрывает их канал."""
+    channel = spectator_channels.pop(room_id, None)
+    if not channel: return
+    runtime.emit(event, data, to=get_spectator_room(room_id))
+    for sid in channel['sids']: spectator_sid_rooms.pop(sid, None)
+    runtime.close_room(get_spectator_room(room_id))
+
+def get_live_games_list():
+    live_games = []
+    for room_id, game_session in active_games.items():
+        game = game_session['game']
+        if game.mode != 'pvp': continue
+        channel = spectator_channels.get(room_id)
+        live_games.append({
+            'roomId': room_id, 'players': game.nicknames_for_client, 'scores': game.scores,
+            'round': game.current_round + 1, 'totalRounds': game.num_rounds,
+            'spectators': len(channel['sids']) if channel else 0
+        })
+    return live_games
+
+# --- Турниры по швейцарской системе ---
+
+def create_tournament(name, creator_sid, settings, num_rounds=None, persist_ratings=True, session_overrides=None):
+    tournament_id = str(uuid.uuid4())
+    tournaments[tournament_id] = {
+        'id': tournament_id, 'name': name, 'creator_sid': creator_sid, 'settings': settings or {},
+        'status': 'registration', 'entrants': {}, 'num_rounds': num_rounds, 'current_round': 0,
+        'pending_rooms': set(), 'persist_ratings': persist_ratings,
+        'session_overrides': session_overrides or {}, 'rating_changes': {}
+    }
+    return tournaments[tournament_id]
+
+def add_tournament_entrant(tournament, nickname, sid, skill=None, rating=1500.0, rd=350.0, vol=0.06):
+    entrant = {
+        'nickname': nickname, 'sid': sid, 'rating': rating, 'rd': rd, 'vol': vol,
+        'score': 0.0, 'opponents': set(), 'results': [], 'had_bye': False, 'disconnected': False
+    }
+    if skill is not None: entrant['skill'] = skill
+    tournament['entrants'][nickname] = entrant
+    if sid != 'BOT': runtime.enter_room(sid, get_tournament_room(tournament['id']))
+    return entrant
+
+def get_tournament_room(tournament_id): return f"tournament_{tournament_id}"
+
+def get_tournament_standings(tournament):
+    ranked = sorted(tournament['entrants'].values(), key=lambda e: (-e['score'], -e['rating']))
+    return [{'nickname': e['nickname'], 'score': e['score'], 'rating': int(e['rating']),
+             'rating_change': tournament['rating_changes'].get(e['nickname'])} for e in ranked]
+
+def start_tournament(tournament_id):
+    tournament = tournaments[tournament_id]
+    tournament['status'] = 'starting'
+    if tournament['persist_ratings']:
+        runtime.run_blocking(lambda: load_tournament_ratings(list(tournament['entrants'])),
+                             lambda ratings: launch_tournament(tournament_id, ratings),
+                             on_error=lambda e: cancel_tournament(tournament_id, e))
+    else:
+        launch_tournament(tournament_id, {})
+
+def load_tournament_ratings(nicknames):
+    # Один запрос на всех участников вместо запроса на каждого
     with app.app_context():
-        for room_id, game_info in open_games.items():
-            creator_user = User.query.filter_by(nickname=game_info['creator']['nickname']).first()
-            if creator_user:
-                lobby_list.append({
-                    'settings': game_info['settings'], 'creator_nickname': creator_user.nickname,
-                    'creator_rating': int(creator_user.rating), 'creator_sid': game_info['creator']['sid']
-                })
-    return lobby_list
-
-@socketio.on('connect')
+        return {user.nickname: {'rating': user.rating, 'rd': user.rd, 'vol': user.vol}
+                for user in User.query.filter(User.nickname.in_(nicknames)).all()}
+
+def cancel_tournament(tournament_id, error):
+    """Рейтинги участников не прочитались — турнир не стартует, участники узнают об этом сразу."""
+    tournament = tournaments[tournament_id]
+    tournament['status'] = 'cancelled'
+    print(f"[TOURNAMENT] Турнир {tournament['name']} отменен: не удалось прочитать рейтинги ({error}).")
+    runtime.emit('tournament_cancelled', {'tournamentId': tournament_id, 'message': 'Ошибка сервера. Турнир отменен.'}, to=get_tournament_room(tournament_id))
+    runtime.close_room(get_tournament_room(tournament_id))
+    start_tracked_task(forget_tournament, tournament_id, delay=TOURNAMENT_RETENTION)
+
+def launch_tournament(tournament_id, ratings):
+    tournament = tournaments[tournament_id]
+    entrants = tournament['entrants']
+    for nickname, rating in ratings.items():
+        if nickname in entrants: entrants[nickname].update(rating)
+    if not tournament['num_rounds']:
+        tournament['num_rounds'] = max(1, math.ceil(math.log2(max(len(entrants), 2))))
+    tournament['status'] = 'running'
+    print(f"[TOURNAMENT] Турнир {tournament['name']} стартует: {len(entrants)} участников, {tournament['num_rounds']} туров.")
+    start_tracked_task(start_tournament_round, tournament_id)
+
+def pair_swiss_round(tournament):
+    """Пары по очкам, затем по рейтингу Глико; повторные встречи только если иначе никак."""
+    ranked = sorted(tournament['entrants'].values(), key=lambda e: (-e['score'], -e['rating']))
+    bye = None
+    if len(ranked) % 2:
+        bye = next((e for e in reversed(ranked) if not e['had_bye']), ranked[-1])
+        ranked.remove(bye)
+    pairs, unpaired = [], ranked
+    while unpaired:
+        first = unpaired.pop(0)
+        opponent_pos = next((i for i, e in enumerate(unpaired) if e['nickname'] not in first['opponents']), 0)
+        pairs.append((first, unpaired.pop(opponent_pos)))
+    return pairs, bye
+
+def start_tournament_round(tournament_id):
+    tournament = tournaments.get(tournament_id)
+    if not tournament: return
+    tournament['current_round'] += 1
+    pairs, bye = pair_swiss_round(tournament)
+    if bye:
+        bye['score'] += 1.0
+        bye['had_bye'] = True
+    room_ids = []
+    for p1, p2 in pairs:
+        absent = [e for e in (p1, p2) if e['disconnected'] or (e['sid'] != 'BOT' and is_player_busy(e['sid']))]
+        if absent:
+            # Участник отключился или занят другой игрой — техническое поражение без создания комнаты
+            loser = absent[0]
+            winner = p2 if loser is p1 else p1
+            apply_tournament_outcome(winner, loser, 1.0)
+            continue
+        room_id = str(uuid.uuid4())
+        players_info = []
+        for entrant in (p1, p2):
+            info = {'sid': entrant['sid'], 'nickname': entrant['nickname'], 'tournament_entrant': entrant}
+            if 'skill' in entrant: info['skill'] = entrant['skill']
+            if entrant['sid'] != 'BOT':
+                remove_player_from_lobby(entrant['sid'])
+                runtime.enter_room(entrant['sid'], room_id)
+            players_info.append(info)
+        game = GameState(players_info[0], all_leagues_data, player2_info=players_info[1], mode='pvp', settings=dict(tournament['settings']))
+        active_games[room_id] = new_game_session(game, tournament_id=tournament_id, **tournament['session_overrides'])
+        tournament['pending_rooms'].add(room_id)
+        room_ids.append(room_id)
+    print(f"[TOURNAMENT] Турнир {tournament['name']}: тур {tournament['current_round']}/{tournament['num_rounds']}, партий: {len(room_ids)}.")
+    broadcast_lobby_stats()
+    runtime.emit('tournament_update', {'tournamentId': tournament_id, 'round': tournament['current_round'], 'standings': get_tournament_standings(tournament)}, to=get_tournament_room(tournament_id))
+    # Все партии тура созданы заранее; запускаем их пачками, отдавая управление между пачками
+    start_tournament_batch(tournament_id, room_ids)
+
+def start_tournament_batch(tournament_id, room_ids):
+    tournament = tournaments.get(tournament_id)
+    if not tournament: return
+    for room_id in room_ids[:TOURNAMENT_START_BATCH]:
+        start_game_loop(room_id)
+    if len(room_ids) > TOURNAMENT_START_BATCH:
+        start_tracked_task(start_tournament_batch, tournament_id, room_ids[TOURNAMENT_START_BATCH:])
+    elif not tournament['pending_rooms']:
+        start_tracked_task(advance_tournament, tournament_id)
+
+def apply_tournament_outcome(p1, p2, p1_outcome):
+    p1['score'] += p1_outcome
+    p2['score'] += 1.0 - p1_outcome
+    p1['opponents'].add(p2['nickname']); p2['opponents'].add(p1['nickname'])
+    p1['results'].append((p2['rating'], p2['rd'], p1_outcome))
+    p2['results'].append((p1['rating'], p1['rd'], 1.0 - p1_outcome))
+
+def record_tournament_result(tournament_id, room_id, scores):
+    tournament = tournaments.get(tournament_id)
+    if not tournament or room_id not in tournament['pending_rooms']: return
+    tournament['pending_rooms'].discard(room_id)
+    game = active_games[room_id]['game']
+    p1, p2 = game.players[0]['tournament_entrant'], game.players[1]['tournament_entrant']
+    p1_outcome = 1.0 if scores[0] > scores[1] else 0.0 if scores[1] > scores[0] else 0.5
+    apply_tournament_outcome(p1, p2, p1_outcome)
+    if not tournament['pending_rooms']:
+        start_tracked_task(advance_tournament, tournament_id)
+
+def advance_tournament(tournament_id):
+    tournament = tournaments.get(tournament_id)
+    if not tournament or tournament['status'] != 'running': return
+    if tournament['current_round'] < tournament['num_rounds']:
+        start_tournament_round(tournament_id)
+    else:
+        finish_tournament(tournament_id)
+
+def finish_tournament(tournament_id):
+    """Пакетное обновление Глико: весь турнир считается одним рейтинговым периодом."""
+    tournament = tournaments[tournament_id]
+    new_ratings = {}
+    for nickname, entrant in tournament['entrants'].items():
+        glicko_player = Player(rating=entrant['rating'], rd=entrant['rd'], vol=entrant['vol'])
+        if entrant['results']:
+            ratings, rds, outcomes = zip(*entrant['results'])
+            glicko_player.update_player(list(ratings), list(rds), list(outcomes))
+        else:
+            glicko_player.did_not_compete()
+        new_ratings[nickname] = (glicko_player.rating, glicko_player.rd, glicko_player.vol)
+
+    tournament['status'] = 'finishing'
+    if tournament['persist_ratings']:
+        runtime.run_blocking(lambda: save_tournament_ratings(new_ratings),
+                             lambda _: publish_tournament_results(tournament_id, new_ratings),
+                             on_error=lambda e: publish_tournament_results(tournament_id, new_ratings, saved=False, error=e))
+    else:
+        publish_tournament_results(tournament_id, new_ratings)
+
+def save_tournament_ratings(new_ratings):
+    with app.app_context():
+        for user in User.query.filter(User.nickname.in_(list(new_ratings))).all():
+            user.rating, user.rd, user.vol = new_ratings[user.nickname]
+        db.session.commit()
+
+def publish_tournament_results(tournament_id, new_ratings, saved=True, error=None):
+    tournament = tournaments[tournament_id]
+    # Запись в БД не удалась — итоги все равно объявляем, но рейтинги игроков в БД прежние
+    if not saved: print(f"[ERROR] Турнир {tournament['name']}: рейтинги не сохранены ({error}).")
+    for nickname, (rating, rd, vol) in new_ratings.items():
+        entrant = tournament['entrants'][nickname]
+        tournament['rating_changes'][nickname] = int(rating) - int(entrant['rating'])
+        entrant['rating'], entrant['rd'], entrant['vol'] = rating, rd, vol
+    tournament['status'] = 'finished'
+    standings = get_tournament_standings(tournament)
+    print(f"[TOURNAMENT] Турнир {tournament['name']} завершен. Победитель: {standings[0]['nickname'] if standings else '-'}")
+    runtime.emit('tournament_finished', {'tournamentId': tournament_id, 'standings': standings, 'ratingsSaved': saved}, to=get_tournament_room(tournament_id))
+    runtime.close_room(get_tournament_room(tournament_id))
+    start_tracked_task(forget_tournament, tournament_id, delay=TOURNAMENT_RETENTION)
+
+def forget_tournament(tournament_id):
+    tournaments.pop(tournament_id, None)
+
+def remove_tournament_entrant(sid):
+    """На регистрации отключившийся просто выбывает, в идущем турнире — проигрывает оставшиеся партии."""
+    for tournament_id, tournament in list(tournaments.items()):
+        if tournament['status'] == 'registration':
+            if tournament['creator_sid'] == sid:
+                del tournaments[tournament_id]
+                print(f"[TOURNAMENT] Создатель отключился. Турнир {tournament['name']} отменен.")
+                continue
+            for nickname in [n for n, e in tournament['entrants'].items() if e['sid'] == sid]:
+                del tournament['entrants'][nickname]
+        elif tournament['status'] in ('starting', 'running'):
+            for entrant in tournament['entrants'].values():
+                if entrant['sid'] == sid: entrant['disconnected'] = True
+
+def get_lobby_data_list():
+    # Рейтинг создателя читается из БД один раз при создании комнаты
+    return [{'settings': game_info['settings'], 'creator_nickname': game_info['creator']['nickname'],
+             'creator_rating': game_info['creator']['rating'], 'creator_sid': game_info['creator']['sid']}
+            for game_info in open_games.values()]
+
+@runtime.on('connect')
 def handle_connect():
     sid = request.sid
     print(f"[CONNECTION] Клиент подключился: {sid}")
     add_player_to_lobby(sid)
     emit('update_lobby', get_lobby_data_list())
 
-@socketio.on('disconnect')
+@runtime.on('disconnect')
 def handle_disconnect():
     sid = request.sid
     print(f"[CONNECTION] Клиент отключился: {sid}")
     remove_player_from_lobby(sid)
+    remove_spectator(sid)
+    remove_tournament_entrant(sid)
     
     room_to_delete_from_lobby = next((rid for rid, g in open_games.items() if g['creator']['sid'] == sid), None)
     if room_to_delete_from_lobby:
         del open_games[room_to_delete_from_lobby]
         print(f"[LOBBY] Создатель отключился. Комната {room_to_delete_from_lobby} удалена.")
-        socketio.emit('update_lobby', get_lobby_data_list())
+        runtime.emit('update_lobby', get_lobby_data_list())
 
     game_to_terminate_id = None
     opponent_sid = None
@@ -403,14 +984,21 @@ def handle_disconnect():
             add_player_to_lobby(opponent_sid)
             emit('opponent_disconnected', {'message': 'Соперник отключился. Игра отменена.'}, room=opponent_sid)
             print(f"[GAME] Отправлено уведомление об отключении сопернику {opponent_sid}.")
+        close_spectator_channel(game_to_terminate_id, 'spectator_game_cancelled', {'message': 'Один из игроков отключился. Игра отменена.'})
+        tournament_id = active_games[game_to_terminate_id].get('tournament_id')
+        if tournament_id:
+            # Отключившийся проигрывает турнирную партию техническим поражением
+            forfeit_scores = {disconnected_player_index: 0.0, 1 - disconnected_player_index: 1.0}
+            record_tournament_result(tournament_id, game_to_terminate_id, forfeit_scores)
         del active_games[game_to_terminate_id]
         broadcast_lobby_stats()
 
-@socketio.on('request_skip_pause')
+@runtime.on('request_skip_pause')
 def handle_request_skip_pause(data):
     room_id = data.get('roomId')
     game_session = active_games.get(room_id)
     if not game_session: return
+    game_session['events'] += 1
     game = game_session['game']
     if game.mode == 'solo':
         game_session['pause_id'] = None
@@ -420,88 +1008,181 @@ def handle_request_skip_pause(data):
         if player_index != -1:
             game_session['skip_votes'].add(player_index)
             emit('skip_vote_accepted')
-            socketio.emit('skip_vote_update', {'count': len(game_session['skip_votes'])}, room=room_id)
+            emit_to_room(room_id, 'skip_vote_update', {'count': len(game_session['skip_votes'])})
             if len(game_session['skip_votes']) >= len(game.players):
                 game_session['pause_id'] = None
                 start_game_loop(room_id)
 
-@socketio.on('get_leaderboard')
+@runtime.on('get_leaderboard')
 def handle_get_leaderboard():
-    emit('leaderboard_data', get_leaderboard_data())
+    sid = request.sid
+    runtime.run_blocking(load_leaderboard, lambda leaderboard: runtime.emit('leaderboard_data', leaderboard, to=sid))
 
-@socketio.on('get_league_clubs')
+@runtime.on('get_league_clubs')
 def handle_get_league_clubs(data):
     league_name = data.get('league', 'РПЛ')
     league_data = all_leagues_data.get(league_name, {})
     club_list = sorted(list(league_data.keys()))
     emit('league_clubs_data', {'league': league_name, 'clubs': club_list})
 
-@socketio.on('register_user')
+@runtime.on('get_live_games')
+def handle_get_live_games():
+    emit('live_games_data', get_live_games_list())
+
+@runtime.on('spectate_game')
+def handle_spectate_game(data):
+    sid, room_id = request.sid, data.get('roomId')
+    game_session = active_games.get(room_id)
+    if not game_session or game_session['game'].mode != 'pvp': return
+    game = game_session['game']
+    # Игрок этой или другой партии, а также создатель открытой комнаты смотреть не может
+    if is_player_busy(sid):
+        print(f"[SECURITY] Игрок {sid} уже занят, попытка смотреть игру отклонена.")
+        return
+    remove_spectator(sid)
+    channel = spectator_channels.setdefault(room_id, {'sids': set(), 'dirty': False, 'flusher_running': False, 'last_sent': 0.0, 'phase': 'turn'})
+    channel['sids'].add(sid)
+    spectator_sid_rooms[sid] = room_id
+    join_room(get_spectator_room(room_id))
+    print(f"[SPECTATE] Зритель {sid} смотрит комнату {room_id}. Зрителей: {len(channel['sids'])}")
+    emit('spectator_snapshot', build_spectator_snapshot(room_id, game, channel))
+
+@runtime.on('stop_spectating')
+def handle_stop_spectating():
+    remove_spectator(request.sid)
+
+@runtime.on('get_tournaments')
+def handle_get_tournaments():
+    emit('tournaments_data', [{
+        'tournamentId': t['id'], 'name': t['name'], 'status': t['status'], 'entrants': len(t['entrants']),
+        'round': t['current_round'], 'totalRounds': t['num_rounds']
+    } for t in tournaments.values()])
+
+@runtime.on('create_tournament')
+def handle_create_tournament(data):
+    name, settings, num_rounds = data.get('name') or 'Турнир', data.get('settings'), data.get('num_rounds')
+    if num_rounds is not None and (type(num_rounds) is not int or not 1 <= num_rounds <= TOURNAMENT_MAX_ROUNDS):
+        print(f"[SECURITY] Игрок {request.sid}: некорректное число туров {num_rounds!r}, турнир не создан.")
+        return
+    tournament = create_tournament(name, request.sid, settings, num_rounds=num_rounds)
+    print(f"[TOURNAMENT] Игрок {request.sid} создал турнир {tournament['name']} ({tournament['id']}).")
+    emit('tournament_created', {'tournamentId': tournament['id']})
+
+@runtime.on('join_tournament')
+def handle_join_tournament(data):
+    tournament = tournaments.get(data.get('tournamentId'))
+    nickname = data.get('nickname')
+    if not tournament or tournament['status'] != 'registration' or not nickname: return
+    # Один sid — один участник, иначе игрок попадет в пару сам с собой
+    if nickname in tournament['entrants'] or any(e['sid'] == request.sid for e in tournament['entrants'].values()): return
+    add_tournament_entrant(tournament, nickname, request.sid)
+    runtime.emit('tournament_update', {'tournamentId': tournament['id'], 'round': 0, 'standings': get_tournament_standings(tournament)}, to=get_tournament_room(tournament['id']))
+
+@runtime.on('start_tournament')
+def handle_start_tournament(data):
+    tournament = tournaments.get(data.get('tournamentId'))
+    if not tournament or tournament['creator_sid'] != request.sid or tournament['status'] != 'registration': return
+    if len(tournament['entrants']) < 2: return
+    start_tournament(tournament['id'])
+
+@runtime.on('register_user')
 def handle_register_user(data):
     nickname, password = data.get('nickname'), data.get('password')
     if not nickname or not password or len(nickname) < 3 or len(nickname) > 15 or not re.match(r'^[a-zA-Z0-9а-яА-Я_-]+$', nickname) or len(password) < 3:
         emit('auth_status', {'success': False, 'message': 'Неверные данные для регистрации.', 'form': 'register'})
         return
-    with app.app_context():
-        if User.query.filter_by(nickname=nickname).first():
-            emit('auth_status', {'success': False, 'message': 'Этот никнейм уже занят.', 'form': 'register'})
-        else:
+    sid = request.sid
+    def register():
+        with app.app_context():
+            if User.query.filter_by(nickname=nickname).first(): return False
             get_or_create_user(nickname, password)
+            return True
+    def reply(created):
+        if not created:
+            runtime.emit('auth_status', {'success': False, 'message': 'Этот никнейм уже занят.', 'form': 'register'}, to=sid)
+        else:
             print(f"[AUTH] Зарегистрирован новый игрок: {nickname}")
-            emit('auth_status', {'success': True, 'nickname': nickname, 'form': 'register'})
+            runtime.emit('auth_status', {'success': True, 'nickname': nickname, 'form': 'register'}, to=sid)
+    def failed(error):
+        print(f"[AUTH] Ошибка регистрации {nickname}: {error!r}")
+        runtime.emit('auth_status', {'success': False, 'message': 'Ошибка сервера, попробуйте позже.', 'form': 'register'}, to=sid)
+    runtime.run_blocking(register, reply, on_error=failed)
 
-@socketio.on('login_user')
+@runtime.on('login_user')
 def handle_login_user(data):
     nickname, password = data.get('nickname'), data.get('password')
     if not nickname or not password:
         emit('auth_status', {'success': False, 'message': 'Введите никнейм и пароль.', 'form': 'login'})
         return
     
-    with app.app_context():
-        user = User.query.filter_by(nickname=nickname).first()
-        if not user or not user.password_hash or not check_password_hash(user.password_hash, password):
-            emit('auth_status', {'success': False, 'message': 'Неверный никнейм или пароль.', 'form': 'login'})
+    sid = request.sid
+    def check_credentials():
+        with app.app_context():
+            user = User.query.filter_by(nickname=nickname).first()
+            return bool(user and user.password_hash and check_password_hash(user.password_hash, password))
+    def reply(valid):
+        if not valid:
+            runtime.emit('auth_status', {'success': False, 'message': 'Неверный никнейм или пароль.', 'form': 'login'}, to=sid)
         else:
             print(f"[AUTH] Игрок {nickname} успешно вошел в систему.")
-            emit('auth_status', {'success': True, 'nickname': nickname, 'form': 'login'})
+            runtime.emit('auth_status', {'success': True, 'nickname': nickname, 'form': 'login'}, to=sid)
+    def failed(error):
+        print(f"[AUTH] Ошибка входа {nickname}: {error!r}")
+        runtime.emit('auth_status', {'success': False, 'message': 'Ошибка сервера, попробуйте позже.', 'form': 'login'}, to=sid)
+    runtime.run_blocking(check_credentials, reply, on_error=failed)
 
-@socketio.on('start_game')
+@runtime.on('start_game')
 def handle_start_game(data):
     sid, mode, nickname, settings = request.sid, data.get('mode'), data.get('nickname'), data.get('settings')
     
     if is_player_busy(sid):
         print(f"[SECURITY] Игрок {sid} уже занят, попытка начать тренировку отклонена.")
         return
+    remove_spectator(sid)
 
     if mode == 'solo':
-        with app.app_context():
-            player_user = get_or_create_user(nickname)
-        player1_info_full = {'sid': sid, 'nickname': nickname, 'user_obj': player_user}
-        room_id = str(uuid.uuid4())
-        join_room(room_id)
-        
-        game = GameState(player1_info_full, all_leagues_data, mode='solo', settings=settings)
-        active_games[room_id] = {'game': game, 'turn_id': None, 'pause_id': None, 'skip_votes': set()}
-        
-        broadcast_lobby_stats()
-        print(f"[GAME] Игрок {nickname} начал тренировку. Комната: {room_id}")
-        start_game_loop(room_id)
+        def load_user():
+            with app.app_context():
+                return get_or_create_user(nickname)
+        def begin(player_user):
+            # Пока шел запрос к БД, игрок мог успеть начать другую игру
+            if is_player_busy(sid): return
+            player1_info_full = {'sid': sid, 'nickname': nickname, 'user_obj': player_user}
+            room_id = str(uuid.uuid4())
+            join_room(room_id, sid=sid)
+            
+            game = GameState(player1_info_full, all_leagues_data, mode='solo', settings=settings)
+            active_games[room_id] = new_game_session(game)
+            
+            broadcast_lobby_stats()
+            print(f"[GAME] Игрок {nickname} начал тренировку. Комната: {room_id}")
+            start_game_loop(room_id)
+        runtime.run_blocking(load_user, begin)
 
-@socketio.on('create_game')
+@runtime.on('create_game')
 def handle_create_game(data):
     sid, nickname, settings = request.sid, data.get('nickname'), data.get('settings')
 
     if is_player_busy(sid):
         print(f"[SECURITY] Игрок {sid} уже занят, попытка создать игру отклонена.")
         return
+    remove_spectator(sid)
             
-    room_id = str(uuid.uuid4())
-    join_room(room_id)
-    open_games[room_id] = {'creator': {'sid': sid, 'nickname': nickname}, 'settings': settings}
-    print(f"[LOBBY] Игрок {nickname} создал комнату {room_id}. Настройки: {settings}")
-    socketio.emit('update_lobby', get_lobby_data_list())
+    def load_rating():
+        with app.app_context():
+            creator_user = User.query.filter_by(nickname=nickname).first()
+            return int(creator_user.rating) if creator_user else None
+    def open_room(creator_rating):
+        # Без записи в БД комната в лобби не показывается, как и раньше
+        if creator_rating is None or is_player_busy(sid): return
+        room_id = str(uuid.uuid4())
+        join_room(room_id, sid=sid)
+        open_games[room_id] = {'creator': {'sid': sid, 'nickname': nickname, 'rating': creator_rating}, 'settings': settings, 'created_at': time.time()}
+        print(f"[LOBBY] Игрок {nickname} создал комнату {room_id}. Настройки: {settings}")
+        runtime.emit('update_lobby', get_lobby_data_list())
+    runtime.run_blocking(load_rating, open_room)
 
-@socketio.on('cancel_game')
+@runtime.on('cancel_game')
 def handle_cancel_game():
     sid = request.sid
     room_to_delete = next((rid for rid, g in open_games.items() if g['creator']['sid'] == sid), None)
@@ -510,9 +1191,9 @@ def handle_cancel_game():
         leave_room(room_to_delete)
         del open_games[room_to_delete]
         print(f"[LOBBY] Создатель {sid} отменил игру. Комната {room_to_delete} удалена.")
-        socketio.emit('update_lobby', get_lobby_data_list())
+        runtime.emit('update_lobby', get_lobby_data_list())
 
-@socketio.on('join_game')
+@runtime.on('join_game')
 def handle_join_game(data):
     creator_sid, joiner_nickname = data.get('creator_sid'), data.get('nickname')
     
@@ -523,44 +1204,66 @@ def handle_join_game(data):
         return
     
     game_to_join = open_games.pop(room_id_to_join)
-    socketio.emit('update_lobby', get_lobby_data_list())
+    runtime.emit('update_lobby', get_lobby_data_list())
 
     creator_info = game_to_join['creator']
     
     if creator_info['sid'] == request.sid:
         open_games[room_id_to_join] = game_to_join
-        socketio.emit('update_lobby', get_lobby_data_list())
+        runtime.emit('update_lobby', get_lobby_data_list())
         return
 
-    with app.app_context():
-        p1_user = get_or_create_user(creator_info['nickname'])
-        p2_user = get_or_create_user(joiner_nickname)
-
-    p1_info_full = {'sid': creator_info['sid'], 'nickname': creator_info['nickname'], 'user_obj': p1_user}
-    p2_info_full = {'sid': request.sid, 'nickname': joiner_nickname, 'user_obj': p2_user}
-    
-    join_room(room_id_to_join, sid=p2_info_full['sid'])
-
-    remove_player_from_lobby(p1_info_full['sid'])
-    remove_player_from_lobby(p2_info_full['sid'])
+    joiner_sid = request.sid
+    def load_users():
+        with app.app_context():
+            users = get_or_create_user(creator_info['nickname']), get_or_create_user(joiner_nickname)
+            # Снимок рейтингов на старте: по нему game_over считается без обращения к БД
+            return [(user, (user.rating, user.rd, user.vol)) for user in users]
+    def begin(users):
+        (p1_user, p1_snapshot), (p2_user, p2_snapshot) = users
+        if is_player_busy(creator_info['sid']) or is_player_busy(joiner_sid):
+            print(f"[LOBBY] Один из игроков комнаты {room_id_to_join} уже в другой игре. Отклонено.")
+            return
+        p1_info_full = {'sid': creator_info['sid'], 'nickname': creator_info['nickname'], 'user_obj': p1_user, 'rating_snapshot': p1_snapshot}
+        p2_info_full = {'sid': joiner_sid, 'nickname': joiner_nickname, 'user_obj': p2_user, 'rating_snapshot': p2_snapshot}
+        
+        join_room(room_id_to_join, sid=p2_info_full['sid'])
+        remove_spectator(p1_info_full['sid'])
+        remove_spectator(p2_info_full['sid'])
 
-    game = GameState(p1_info_full, all_leagues_data, player2_info=p2_info_full, mode='pvp', settings=game_to_join['settings'])
-    active_games[room_id_to_join] = {'game': game, 'turn_id': None, 'pause_id': None, 'skip_votes': set()}
-    
-    broadcast_lobby_stats()
-    print(f"[GAME] Начинается PvP игра: {p1_info_full['nickname']} vs {p2_info_full['nickname']}. Комната: {room_id_to_join}")
-    start_game_loop(room_id_to_join)
+        remove_player_from_lobby(p1_info_full['sid'])
+        remove_player_from_lobby(p2_info_full['sid'])
 
-@socketio.on('submit_guess')
+        game = GameState(p1_info_full, all_leagues_data, player2_info=p2_info_full, mode='pvp', settings=game_to_join['settings'])
+        active_games[room_id_to_join] = new_game_session(game)
+        
+        broadcast_lobby_stats()
+        print(f"[GAME] Начинается PvP игра: {p1_info_full['nickname']} vs {p2_info_full['nickname']}. Комната: {room_id_to_join}")
+        start_game_loop(room_id_to_join)
+    def failed(error):
+        # Комната уже снята из лобби — возвращаем ее, если создатель все еще ждет соперника
+        print(f"[LOBBY] Не удалось начать игру в комнате {room_id_to_join}: {error!r}")
+        if creator_info['sid'] in lobby_sids and not is_player_busy(creator_info['sid']):
+            open_games[room_id_to_join] = game_to_join
+        runtime.emit('update_lobby', get_lobby_data_list())
+    runtime.run_blocking(load_users, begin, on_error=failed)
+
+@runtime.on('submit_guess')
 def handle_submit_guess(data):
     room_id, guess = data.get('roomId'), data.get('guess')
     game_session = active_games.get(room_id)
     if not game_session: return
+    game_session['events'] += 1
     game = game_session['game']
     current_player_sid = game.players[game.current_player_index].get('sid')
     if current_player_sid != request.sid: 
         return
-    
+    apply_guess(room_id, guess, request.sid)
+
+def apply_guess(room_id, guess, sid):
+    """Обрабатывает ответ текущего игрока (человека или бота) и двигает игру дальше."""
+    game_session = active_games[room_id]
+    game = game_session['game']
     result = game.process_guess(guess)
     if result['result'] in ['correct', 'correct_typo']:
         time_spent = time.time() - game.turn_start_time
@@ -570,7 +1273,8 @@ def handle_submit_guess(data):
             on_timer_end(room_id); return
         
         game.add_named_player(result['player_data'], game.current_player_index)
-        emit('guess_result', {'result': result['result'], 'corrected_name': result['player_data']['full_name']})
+        if sid != 'BOT':
+            runtime.emit('guess_result', {'result': result['result'], 'corrected_name': result['player_data']['full_name']}, to=sid)
         
         if game.is_round_over():
             game_session['last_round_end_reason'] = 'completed'
@@ -578,29 +1282,197 @@ def handle_submit_guess(data):
             show_round_summary_and_schedule_next(room_id)
         else:
             start_next_human_turn(room_id)
-    else:
-        emit('guess_result', {'result': result['result']})
+    elif sid != 'BOT':
+        runtime.emit('guess_result', {'result': result['result']}, to=sid)
 
-@socketio.on('surrender_round')
+@runtime.on('surrender_round')
 def handle_surrender(data):
     room_id = data.get('roomId')
     game_session = active_games.get(room_id)
     if not game_session: return
+    game_session['events'] += 1
     game = game_session['game']
-    surrendering_player_index = game.current_player_index
-    if game.players[surrendering_player_index].get('sid') != request.sid:
+    if game.players[game.current_player_index].get('sid') != request.sid:
         return
+    apply_surrender(room_id)
+
+def apply_surrender(room_id):
+    game_session = active_games[room_id]
+    game = game_session['game']
+    surrendering_player_index = game.current_player_index
     game_session['turn_id'] = None 
     game_session['last_round_end_reason'] = 'surrender'
     game_session['last_round_end_player_nickname'] = game.players[surrendering_player_index]['nickname']
     print(f"[GAME] Игрок {game.players[surrendering_player_index]['nickname']} сдался в комнате {room_id}.")
     on_timer_end(room_id)
 
+# --- Статика: версионирование, предварительное сжатие и условные GET ---
+
+def build_cached_entry(body, mimetype):
+    """Готовит тело ответа во всех поддерживаемых кодировках и сильные ETag для каждой."""
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {
+        'digest': digest, 'mimetype': mimetype, 'variants': variants,
+        'etags': {encoding: f"{digest}-{encoding}" for encoding in variants}
+    }
+
+def load_static_assets(static_dir):
+    """Читает файлы из static/ один раз и раздает их по URL с хэшем содержимого."""
+    assets, asset_urls = {}, {}
+    for name in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, name)
+        if not os.path.isfile(path): continue
+        with open(path, 'rb') as f:
+            body = f.read()
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        entry = build_cached_entry(body, mimetype)
+        stem, ext = os.path.splitext(name)
+        versioned_name = f"{stem}.{entry['digest']}{ext}"
+        assets[versioned_name] = entry
+        asset_urls[name] = f"/assets/{versioned_name}"
+    return assets, asset_urls
+
+def choose_encoding(entry):
+    """Выбирает лучшую доступную кодировку по заголовку Accept-Encoding."""
+    for encoding in ('br', 'gzip'):
+        if encoding in entry['variants'] and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+def make_cached_response(entry, cache_control):
+    encoding = choose_encoding(entry)
+    etag = entry['etags'][encoding]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry['variants'][encoding], mimetype=entry['mimetype'])
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+static_assets, asset_urls = load_static_assets(os.path.join(basedir, 'static'))
+with app.app_context():
+    # Оболочка страницы не зависит от запроса — рендерим ее один раз при старте
+    index_page = build_cached_entry(render_template('index.html', asset_urls=asset_urls).encode('utf-8'), 'text/html')
+print(f"[STATIC] Подготовлено ассетов: {len(static_assets)}. Brotli: {'да' if brotli else 'нет'}")
+
 @app.route('/')
-def index(): return render_template('index.html')
+def index(): return make_cached_response(index_page, SHELL_CACHE_CONTROL)
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    entry = static_assets.get(filename)
+    if not entry: abort(404)
+    return make_cached_response(entry, ASSET_CACHE_CONTROL)
+
+# --- Админка: интроспекция комнат и процесса ---
+
+shared_object_ids = set()
+
+def get_shared_object_ids():
+    """id общих для всех комнат структур лиг — их не засчитываем в память отдельной комнаты."""
+    if not shared_object_ids:
+        stack = [all_leagues_data, club_fragments, alias_indexes, EMPTY_CLUB_FRAGMENT]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in shared_object_ids: continue
+            shared_object_ids.add(id(obj))
+            if isinstance(obj, dict): stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)): stack.extend(obj)
+    return shared_object_ids
+
+def estimate_retained_size(root):
+    """Приблизительный размер объектов, принадлежащих только этой комнате."""
+    shared, seen, size, stack = get_shared_object_ids(), set(), 0, [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or id(obj) in shared: continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys()); stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif type(obj).__module__ == __name__ and hasattr(obj, '__dict__'):
+            # Свои классы (GameState) обходим, чужие (модели SQLAlchemy) считаем одним объектом
+            stack.append(obj.__dict__)
+    return size
+
+def get_greenlet_inventory():
+    """Полный проход по куче: дорого, поэтому только по запросу."""
+    own_functions = {name for name, value in globals().items() if callable(value) and getattr(value, '__module__', None) == __name__}
+    inventory = {}
+    for obj in gc.get_objects():
+        if not isinstance(obj, greenlet.greenlet) or obj.dead: continue
+        frame, label = obj.gr_frame, 'other'
+        while frame is not None:
+            if frame.f_code.co_name in own_functions:
+                label = frame.f_code.co_name
+            elif frame.f_code.co_name == '_run_later' and label == 'other':
+                # Отложенный вызов еще спит — подписываем его именем функции, которую он вызовет
+                label = getattr(frame.f_locals.get('fn'), '__name__', label)
+            frame = frame.f_back
+        inventory[label] = inventory.get(label, 0) + 1
+    return inventory
+
+def get_process_rss_kb():
+    """Текущий RSS процесса; без /proc (не Linux) — пиковый из getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def get_tracemalloc_report(action):
+    if action == 'stop':
+        tracemalloc.stop()
+        return {'tracing': False}
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        return {'tracing': True, 'message': 'tracemalloc включен, повторите запрос позже'}
+    top_stats = tracemalloc.take_snapshot().statistics('lineno')[:TRACEMALLOC_TOP]
+    return {'tracing': True, 'top': [{'where': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count} for stat in top_stats]}
+
+@app.route('/admin/rooms')
+def admin_rooms():
+    # Без ADMIN_TOKEN эндпоинт выключен. Токен только в заголовке: параметры URL попадают в логи прокси
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()): abort(404)
+    greenlets, tracemalloc_action = request.args.get('greenlets'), request.args.get('tracemalloc')
+    def build_report():
+        now = time.time()
+        rooms = [{
+            'roomId': room_id, 'mode': session['game'].mode, 'tournamentId': session.get('tournament_id'),
+            'age_s': round(now - session['created_at'], 1), 'events': session['events'],
+            'tasks_started': session['tasks_started'], 'tasks_pending': session['tasks_pending'],
+            'spectators': len(spectator_channels[room_id]['sids']) if room_id in spectator_channels else 0,
+            'retained_bytes': estimate_retained_size(session)
+        } for room_id, session in list(active_games.items())]
+        lobby_rooms = [{
+            'roomId': room_id, 'age_s': round(now - info['created_at'], 1), 'retained_bytes': estimate_retained_size(info)
+        } for room_id, info in list(open_games.items())]
+        report = {
+            'active_games': rooms, 'open_games': lobby_rooms, 'running_tasks': dict(running_tasks),
+            'totals': {'active_games': len(active_games), 'open_games': len(open_games), 'lobby_sids': len(lobby_sids),
+                       'spectators': len(spectator_sid_rooms), 'tournaments': len(tournaments),
+                       'pending_tasks': sum(running_tasks.values()), 'rss_kb': get_process_rss_kb()},
+            'alias_index_stats': alias_index_stats, 'finalize': get_finalize_report()
+        }
+        if greenlets: report['greenlets'] = get_greenlet_inventory()
+        if tracemalloc_action: report['tracemalloc'] = get_tracemalloc_report(tracemalloc_action)
+        return report
+    # Под asyncio маршрут работает в потоке WsgiToAsgi, а комнаты меняет цикл событий — отчет снимаем в нем
+    return jsonify(runtime.call_in_loop(build_report))
 
 if __name__ == '__main__':
     if not all_leagues_data: print("КРИТИЧЕСКАЯ ОШИБКА: Не удалось загрузить players.csv")
     else:
         print("Сервер запускается...")
-        socketio.run(app, debug=True)
\ No newline at end of file
+        runtime.run()
\ No newline at end of file
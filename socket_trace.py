@@ -0,0 +1,113 @@
+# socket_trace.py
+#
+# Запись входящего трафика Socket.IO в компактную обезличенную трассу (JSON Lines, можно .gz)
+# для последующего воспроизведения через misc/replay_trace.py. Включается переменной SOCKET_TRACE.
+#
+# Записи трассы (t — миллисекунды от начала записи):
+#   ["i", t, клиент, событие, данные, мс_обработчика]  входящее событие
+#   ["o", t, адресат, событие, сводка]                 исходящее: клиенту, комнате или всем ("*")
+#   ["j", t, клиент, комната] / ["l", t, клиент, комната] / ["c", t, комната]   состав комнат
+# Идентификаторы клиентов, комнат и никнеймы заменяются на c1, r1, n1; пароли не пишутся.
+# От исходящих данных остается только сводка из SUMMARY_FIELDS — по ней ищутся расхождения.
+
+import atexit
+import gzip
+import json
+import time
+
+NICKNAME_KEYS = {'nickname', 'creator_nickname', 'player_nickname'}
+SECRET_KEYS = {'password'}
+SUMMARY_FIELDS = ('result', 'success', 'form', 'end_reason', 'mode', 'round')
+MAX_TEXT = 40  # Длинные строки (ответы игроков) обрезаются
+FLUSH_EVERY, FLUSH_INTERVAL = 200, 1.0  # Сброс на диск: каждые N записей или раз в секунду
+
+
+def summarize(data):
+    """Устойчивая к случайности часть ответа сервера: выбранные скалярные поля верхнего уровня."""
+    if not isinstance(data, dict): return None
+    summary = {k: data[k] for k in SUMMARY_FIELDS if isinstance(data.get(k), (str, int, float, bool))}
+    return summary or None
+
+
+def open_trace(path, mode):
+    if path.endswith('.gz'): return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def load_trace(path):
+    records = []
+    with open_trace(path, 'r') as f:
+        try:
+            for line in f:
+                if line.strip(): records.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # Сервер остановили без закрытия файла — берем все, что успело записаться
+            print(f"[TRACE] Трасса {path} обрывается, прочитано записей: {len(records)}")
+    # Входящее событие пишется по окончании обработчика, поэтому упорядочиваем по времени
+    records.sort(key=lambda r: (r[1], r[0] != 'i'))
+    return records
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.file = open_trace(path, 'w')
+        self.started_at = time.perf_counter()
+        self.aliases = {'client': {}, 'room': {}, 'nickname': {}}
+        self.pending, self.flushed_at = 0, self.started_at
+        atexit.register(self.close)
+        print(f"[TRACE] Запись входящих событий в {path}")
+
+    def now_ms(self): return int((time.perf_counter() - self.started_at) * 1000)
+
+    def alias(self, kind, value):
+        names = self.aliases[kind]
+        if value not in names: names[value] = f"{kind[0]}{len(names) + 1}"
+        return names[value]
+
+    def anonymize(self, value, key=None):
+        if isinstance(value, dict):
+            return {k: self.anonymize(v, k) for k, v in value.items() if k not in SECRET_KEYS}
+        if isinstance(value, list):
+            return [self.anonymize(v) for v in value]
+        if isinstance(value, str):
+            if key in NICKNAME_KEYS: return self.alias('nickname', value)
+            if value in self.aliases['client']: return self.aliases['client'][value]
+            if value in self.aliases['room']: return self.aliases['room'][value]
+            return value[:MAX_TEXT]
+        return value
+
+    def target(self, to):
+        if to is None: return '*'
+        if to in self.aliases['client']: return self.aliases['client'][to]
+        return self.alias('room', to)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.pending += 1
+        now = time.perf_counter()
+        if self.pending >= FLUSH_EVERY or now - self.flushed_at >= FLUSH_INTERVAL:
+            self.file.flush()
+            self.pending, self.flushed_at = 0, now
+
+    def begin(self, sid):
+        # Псевдоним клиента нужен уже во время обработки: обработчик connect сразу отвечает этому sid
+        self.alias('client', sid)
+        return time.perf_counter()
+
+    def inbound(self, sid, event, data, started_at):
+        t = int((started_at - self.started_at) * 1000)
+        duration_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        self.write(['i', t, self.alias('client', sid), event, self.anonymize(data), duration_ms])
+
+    def outbound(self, event, data, to):
+        self.write(['o', self.now_ms(), self.target(to), event, summarize(data)])
+
+    def room_change(self, kind, sid, room):
+        self.write([kind, self.now_ms(), self.alias('client', sid), self.alias('room', room)])
+
+    def room_closed(self, room):
+        self.write(['c', self.now_ms(), self.alias('room', room)])
+
+    def close(self):
+        if not self.file.closed: self.file.close()
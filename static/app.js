@@ -0,0 +1,540 @@
+const socket = io();
+
+const screens = {
+    auth: document.getElementById('auth-screen'),
+    lobby: document.getElementById('lobby-screen'),
+    config: document.getElementById('config-screen'),
+    trainingConfig: document.getElementById('training-config-screen'),
+    game: document.getElementById('game-screen'),
+    summary: document.getElementById('summary-screen'),
+    gameOver: document.getElementById('game-over-screen'),
+    leaderboard: document.getElementById('leaderboard-screen'),
+    spectator: document.getElementById('spectator-screen'),
+    disconnection: document.getElementById('disconnection-modal'),
+};
+
+// --- Элементы DOM ---
+const loginForm = document.getElementById('login-form'), loginNickname = document.getElementById('login-nickname'), loginPassword = document.getElementById('login-password'), loginStatus = document.getElementById('login-status');
+const registerForm = document.getElementById('register-form'), registerNickname = document.getElementById('register-nickname'), registerPassword = document.getElementById('register-password'), registerStatus = document.getElementById('register-status');
+const showRegisterFormBtn = document.getElementById('show-register-form'), showLoginFormBtn = document.getElementById('show-login-form');
+
+const welcomeNickname = document.getElementById('welcome-nickname'), logoutBtn = document.getElementById('logout-btn');
+const createGameBtn = document.getElementById('create-game-btn'), leaderboardBtn = document.getElementById('leaderboard-btn');
+const trainingBtn = document.getElementById('training-btn');
+const openGamesList = document.getElementById('open-games-list');
+const onlinePlayersCount = document.getElementById('online-players-count');
+const activeGamesCount = document.getElementById('active-games-count');
+const liveGamesList = document.getElementById('live-games-list'), refreshLiveGamesBtn = document.getElementById('refresh-live-games-btn');
+const spectatorHeader = document.getElementById('spectator-header'), spectatorScoreDisplay = document.getElementById('spectator-score-display'), spectatorStatus = document.getElementById('spectator-status'), spectatorNamedList = document.getElementById('spectator-named-list'), stopSpectatingBtn = document.getElementById('stop-spectating-btn');
+
+const configTimeMin = document.getElementById('config-time-min'), configTimeSec = document.getElementById('config-time-sec');
+const backToLobbyBtn = document.getElementById('back-to-lobby-btn'), submitCreateGameBtn = document.getElementById('submit-create-game-btn');
+const configRoundsSlider = document.getElementById('config-rounds-slider'), configRoundsValue = document.getElementById('config-rounds-value');
+
+const trainingTimeMin = document.getElementById('training-time-min'), trainingTimeSec = document.getElementById('training-time-sec');
+const backToLobbyFromTrainingBtn = document.getElementById('back-to-lobby-from-training-btn'), submitTrainingGameBtn = document.getElementById('submit-training-game-btn');
+const trainingRoundsSlider = document.getElementById('training-rounds-slider'), trainingRoundsValue = document.getElementById('training-rounds-value');
+
+const gameHeader = document.getElementById('game-header'), scoreDisplay = document.getElementById('score-display'), gameStatus = document.getElementById('game-status'), guessForm = document.getElementById('guess-form'), guessInput = document.getElementById('guess-input'), liveNamedList = document.getElementById('live-named-list'), surrenderBtn = document.getElementById('surrender-btn'), submitGuessBtn = document.getElementById('submit-guess-btn');
+const myTimerBox = document.getElementById('my-timer-box'), myTimerNickname = document.getElementById('my-timer-nickname'), myTimerValue = document.getElementById('my-timer-value');
+const opponentTimerBox = document.getElementById('opponent-timer-box'), opponentTimerNickname = document.getElementById('opponent-timer-nickname'), opponentTimerValue = document.getElementById('opponent-timer-value');
+
+const summaryHeader = document.getElementById('summary-header'), summaryScoreDisplay = document.getElementById('summary-score-display'), summaryHumanColumn = document.getElementById('summary-human-column'), summaryBotColumn = document.getElementById('summary-bot-column'), summaryHumanNameHeader = document.getElementById('summary-human-name-header'), summaryBotNameHeader = document.getElementById('summary-bot-name-header'), summaryHumanNamedList = document.getElementById('summary-human-named-list'), summaryBotNamedList = document.getElementById('summary-bot-named-list'), summaryRemainingList = document.getElementById('summary-remaining-list'), summaryCountdown = document.getElementById('summary-countdown'), skipPauseBtn = document.getElementById('skip-pause-btn');
+
+const leaderboardBody = document.getElementById('leaderboard-body'), backToLobbyFromLeaderboardBtn = document.getElementById('back-to-lobby-from-leaderboard-btn');
+const gameOverTitle = document.getElementById('game-over-title'), earlyEndExplanation = document.getElementById('early-end-explanation'), finalScoreDisplay = document.getElementById('final-score-display'), ratingChangesDisplay = document.getElementById('rating-changes-display'), backToLobbyFromGameOverBtn = document.getElementById('back-to-lobby-from-game-over-btn');
+const gameHistoryContainer = document.getElementById('game-history-container'), gameHistoryTable = document.getElementById('game-history-table');
+const disconnectionModal = document.getElementById('disconnection-modal'), backToLobbyFromDisconnectBtn = document.getElementById('back-to-lobby-from-disconnect-btn');
+
+// --- Состояние клиента ---
+let currentUserNickname = null;
+let clientState = {};
+let isMyTurn = false;
+let timerInterval, summaryInterval, gameStatusTimeout, spectatorInterval;
+
+let selectedPvPClubs = null;
+let selectedTrainingClubs = null;
+let lastGameOver = null; // roomId и имена игроков последнего экрана итогов — для уточнения рейтингов
+
+function showScreen(screenName) {
+    Object.values(screens).forEach(screen => screen && screen.classList.add('hidden'));
+    if (screens[screenName]) screens[screenName].classList.remove('hidden');
+}
+
+function formatTime(seconds) {
+    if (seconds < 0) seconds = 0;
+    const mins = Math.floor(seconds / 60);
+    const secs = Math.floor(seconds % 60);
+    return `${String(mins).padStart(2, '0')}:${String(secs).padStart(2, '0')}`;
+}
+
+function updateGameUI(state) {
+    clientState = state;
+    const isSolo = state.mode === 'solo';
+    let myPlayerIndex = -1;
+    if (isSolo) {
+        myPlayerIndex = 0;
+    } else {
+        for (const i in state.players) { if (state.players[i].sid === socket.id) { myPlayerIndex = parseInt(i, 10); break; } }
+    }
+    if (myPlayerIndex === -1) return;
+    
+    const opponentPlayerIndex = 1 - myPlayerIndex;
+    const activePlayerIndex = state.currentPlayerIndex;
+    isMyTurn = (myPlayerIndex === activePlayerIndex);
+
+    scoreDisplay.classList.toggle('hidden', isSolo);
+    opponentTimerBox.classList.toggle('hidden', isSolo);
+    myTimerBox.style.width = isSolo ? '100%' : '48%';
+
+    gameHeader.textContent = `Тур ${state.round}/${state.totalRounds}: ${state.clubName}`;
+    if (!isSolo) {
+        scoreDisplay.textContent = `${state.players[0].nickname} ${state.scores[0]} : ${state.scores[1]} ${state.players[1].nickname}`;
+        opponentTimerNickname.textContent = state.players[opponentPlayerIndex].nickname;
+    }
+    
+    myTimerNickname.textContent = state.players[myPlayerIndex].nickname + (isSolo ? '' : ' (Вы)');
+    submitGuessBtn.disabled = !isMyTurn;
+    surrenderBtn.disabled = !isMyTurn;
+    guessInput.placeholder = 'Введите фамилию...';
+    guessInput.disabled = !isMyTurn;
+
+    if(isMyTurn) guessInput.focus();
+    
+    myTimerBox.classList.toggle('active-turn', isMyTurn);
+    if (!isSolo) opponentTimerBox.classList.toggle('active-turn', !isMyTurn);
+    
+    liveNamedList.innerHTML = '';
+    state.namedPlayers.forEach(player => {
+        const pDiv = document.createElement('div');
+        pDiv.className = 'player-name';
+        const author = state.players[player.by] && !isSolo ? ` (${state.players[player.by].nickname})` : '';
+        pDiv.textContent = `${player.full_name}${author}`;
+        liveNamedList.prepend(pDiv);
+    });
+
+    clearInterval(timerInterval);
+    let timeBanks = {...state.timeBanks};
+    myTimerValue.textContent = formatTime(timeBanks[myPlayerIndex]);
+    if (!isSolo && state.players[opponentPlayerIndex]) {
+        opponentTimerValue.textContent = formatTime(timeBanks[opponentPlayerIndex]);
+    }
+    
+    timerInterval = setInterval(() => {
+        timeBanks[activePlayerIndex] -= 0.1;
+        const activeTimerDisplay = (activePlayerIndex === myPlayerIndex) ? myTimerValue : opponentTimerValue;
+        if(activeTimerDisplay) activeTimerDisplay.textContent = formatTime(timeBanks[activePlayerIndex]);
+        if (timeBanks[activePlayerIndex] <= 0) clearInterval(timerInterval);
+    }, 100);
+}
+
+function updateSpectatorUI(state) {
+    spectatorHeader.textContent = state.phase === 'summary' ? `Итоги тура ${state.round}/${state.totalRounds}: ${state.clubName}` : `Тур ${state.round}/${state.totalRounds}: ${state.clubName}`;
+    spectatorScoreDisplay.textContent = `${state.players[0].nickname} ${state.scores[0]} : ${state.scores[1]} ${state.players[1].nickname}`;
+    spectatorStatus.textContent = `Названо ${state.namedPlayers.length} из ${state.fullPlayerList.length}. Зрителей: ${state.spectators}`;
+
+    spectatorNamedList.innerHTML = '';
+    state.namedPlayers.forEach(player => {
+        const pDiv = document.createElement('div');
+        pDiv.className = 'player-name';
+        pDiv.textContent = `${player.full_name} (${state.players[player.by].nickname})`;
+        spectatorNamedList.prepend(pDiv);
+    });
+
+    clearInterval(spectatorInterval);
+    const timeBanks = {...state.timeBanks};
+    const activePlayerIndex = state.currentPlayerIndex;
+    if (state.phase === 'turn') timeBanks[activePlayerIndex] -= state.turnElapsed;
+    [0, 1].forEach(i => {
+        document.getElementById(`spectator-timer-nickname-${i}`).textContent = state.players[i].nickname;
+        document.getElementById(`spectator-timer-value-${i}`).textContent = formatTime(timeBanks[i]);
+        document.getElementById(`spectator-timer-box-${i}`).classList.toggle('active-turn', state.phase === 'turn' && i === activePlayerIndex);
+    });
+    if (state.phase !== 'turn') return;
+    const activeTimerDisplay = document.getElementById(`spectator-timer-value-${activePlayerIndex}`);
+    spectatorInterval = setInterval(() => {
+        timeBanks[activePlayerIndex] -= 0.1;
+        activeTimerDisplay.textContent = formatTime(timeBanks[activePlayerIndex]);
+        if (timeBanks[activePlayerIndex] <= 0) clearInterval(spectatorInterval);
+    }, 100);
+}
+
+function setupClubSelector(configPrefix) {
+    const selectClubsBtn = document.getElementById(`${configPrefix}-select-clubs-btn`);
+    const clubsSelectionDiv = document.getElementById(`${configPrefix}-clubs-selection`);
+    const roundsSlider = document.getElementById(`${configPrefix}-rounds-slider`);
+    const selectAllBtn = document.getElementById(`${configPrefix}-select-all-clubs`);
+    const deselectAllBtn = document.getElementById(`${configPrefix}-deselect-all-clubs`);
+    const confirmBtn = document.getElementById(`${configPrefix}-confirm-clubs-btn`);
+    const resetBtn = document.getElementById(`${configPrefix}-reset-clubs-btn`);
+    const clubsListDiv = document.getElementById(`${configPrefix}-clubs-list`);
+
+    const isPvp = configPrefix === 'config';
+    const minClubs = isPvp ? 3 : 1;
+
+    selectClubsBtn.addEventListener('click', () => {
+        clubsSelectionDiv.classList.remove('hidden');
+        roundsSlider.disabled = true;
+        selectClubsBtn.disabled = true;
+    });
+
+    resetBtn.addEventListener('click', () => {
+        clubsSelectionDiv.classList.add('hidden');
+        roundsSlider.disabled = false;
+        selectClubsBtn.disabled = false;
+        selectClubsBtn.textContent = 'Выбрать клубы';
+        if (isPvp) selectedPvPClubs = null;
+        else selectedTrainingClubs = null;
+    });
+
+    selectAllBtn.addEventListener('click', () => {
+        clubsListDiv.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = true);
+    });
+
+    deselectAllBtn.addEventListener('click', () => {
+        clubsListDiv.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = false);
+    });
+
+    confirmBtn.addEventListener('click', () => {
+        const selected = Array.from(clubsListDiv.querySelectorAll('input:checked')).map(cb => cb.value);
+        
+        if (selected.length < minClubs) {
+            alert(`Нужно выбрать как минимум ${minClubs} клуб(а).`);
+            return;
+        }
+        
+        if (isPvp) selectedPvPClubs = selected;
+        else selectedTrainingClubs = selected;
+
+        selectClubsBtn.textContent = `Выбрано клубов: ${selected.length}`;
+        selectClubsBtn.disabled = false; // Позволяем снова открыть для редактирования
+        clubsSelectionDiv.classList.add('hidden');
+    });
+}
+
+setupClubSelector('config');
+setupClubSelector('training');
+
+// --- Обработчики событий ---
+showRegisterFormBtn.addEventListener('click', () => { document.getElementById('login-form-container').classList.add('hidden'); document.getElementById('register-form-container').classList.remove('hidden'); });
+showLoginFormBtn.addEventListener('click', () => { document.getElementById('register-form-container').classList.add('hidden'); document.getElementById('login-form-container').classList.remove('hidden'); });
+
+loginForm.addEventListener('submit', e => { e.preventDefault(); loginStatus.textContent = "Проверка..."; socket.emit('login_user', { nickname: loginNickname.value.trim(), password: loginPassword.value }); });
+registerForm.addEventListener('submit', e => { e.preventDefault(); registerStatus.textContent = "Создание аккаунта..."; socket.emit('register_user', { nickname: registerNickname.value.trim(), password: registerPassword.value }); });
+logoutBtn.addEventListener('click', () => {
+    currentUserNickname = null;
+    localStorage.removeItem('rpl_quiz_nickname');
+    showScreen('auth');
+});
+
+createGameBtn.addEventListener('click', () => showScreen('config'));
+trainingBtn.addEventListener('click', () => showScreen('trainingConfig'));
+backToLobbyBtn.addEventListener('click', () => showScreen('lobby'));
+backToLobbyFromTrainingBtn.addEventListener('click', () => showScreen('lobby'));
+leaderboardBtn.addEventListener('click', () => { socket.emit('get_leaderboard'); showScreen('leaderboard'); });
+backToLobbyFromGameOverBtn.addEventListener('click', () => showScreen('lobby'));
+backToLobbyFromLeaderboardBtn.addEventListener('click', () => showScreen('lobby'));
+backToLobbyFromDisconnectBtn.addEventListener('click', () => { showScreen('lobby'); disconnectionModal.classList.add('hidden'); });
+refreshLiveGamesBtn.addEventListener('click', () => socket.emit('get_live_games'));
+stopSpectatingBtn.addEventListener('click', () => { clearInterval(spectatorInterval); socket.emit('stop_spectating'); showScreen('lobby'); socket.emit('get_live_games'); });
+liveGamesList.addEventListener('click', e => {
+    if (e.target.classList.contains('spectate-btn')) socket.emit('spectate_game', { roomId: e.target.dataset.roomId });
+});
+
+submitCreateGameBtn.addEventListener('click', () => {
+    const timeBank = parseInt(configTimeMin.value) * 60 + parseInt(configTimeSec.value);
+    if (isNaN(timeBank) || timeBank <= 0) { alert("Пожалуйста, введите корректное время."); return; }
+    const settings = { 
+        time_bank: timeBank, 
+        num_rounds: selectedPvPClubs ? selectedPvPClubs.length : parseInt(configRoundsSlider.value),
+        selected_clubs: selectedPvPClubs // Будет null, если используется слайдер
+    };
+    socket.emit('create_game', { nickname: currentUserNickname, settings: settings });
+    showScreen('lobby');
+});
+
+submitTrainingGameBtn.addEventListener('click', () => {
+    const timeBank = parseInt(trainingTimeMin.value) * 60 + parseInt(trainingTimeSec.value);
+    if (isNaN(timeBank) || timeBank <= 0) { alert("Пожалуйста, введите корректное время."); return; }
+    const settings = { 
+        time_bank: timeBank, 
+        num_rounds: selectedTrainingClubs ? selectedTrainingClubs.length : parseInt(trainingRoundsSlider.value),
+        selected_clubs: selectedTrainingClubs // Будет null, если используется слайдер
+    };
+    socket.emit('start_game', { mode: 'solo', nickname: currentUserNickname, settings: settings });
+});
+
+configRoundsSlider.addEventListener('input', (e) => { configRoundsValue.textContent = e.target.value; });
+trainingRoundsSlider.addEventListener('input', (e) => { trainingRoundsValue.textContent = e.target.value; });
+
+guessForm.addEventListener('submit', (e) => { e.preventDefault(); if (isMyTurn) { const guess = guessInput.value; if (guess) { socket.emit('submit_guess', { roomId: clientState.roomId, guess: guess }); guessInput.value = ''; } } });
+surrenderBtn.addEventListener('click', () => { if (!surrenderBtn.disabled) socket.emit('surrender_round', { roomId: clientState.roomId }); });
+skipPauseBtn.addEventListener('click', () => { skipPauseBtn.disabled = true; socket.emit('request_skip_pause', { roomId: clientState.roomId }); });
+
+openGamesList.addEventListener('click', e => {
+    if (e.target.classList.contains('play-btn')) {
+        const creatorSid = e.target.dataset.creatorSid;
+        if (currentUserNickname) {
+            socket.emit('join_game', { creator_sid: creatorSid, nickname: currentUserNickname });
+        }
+    } else if (e.target.classList.contains('cancel-btn')) {
+        socket.emit('cancel_game');
+    }
+});
+
+// --- Обработчики Socket.IO ---
+socket.on('auth_status', data => {
+    const statusDiv = document.getElementById(`${data.form}-status`);
+    if (data.success) {
+        currentUserNickname = data.nickname;
+        localStorage.setItem('rpl_quiz_nickname', currentUserNickname);
+        welcomeNickname.textContent = currentUserNickname;
+        showScreen('lobby');
+        socket.emit('get_league_clubs', { league: 'РПЛ' });
+        socket.emit('get_live_games');
+    } else { if (statusDiv) statusDiv.textContent = data.message; }
+});
+
+socket.on('update_lobby', data => {
+    openGamesList.innerHTML = '';
+    let userHasOpenGame = false;
+    if (!data || data.length === 0) {
+        openGamesList.innerHTML = '<p>Нет открытых игр. Создайте свою!</p>';
+    } else {
+        data.forEach(game => {
+            if (game.creator_sid === socket.id) { userHasOpenGame = true; }
+            const gameItem = document.createElement('div');
+            gameItem.className = 'open-game-item';
+            const time_str = `${Math.floor(game.settings.time_bank / 60)}:${String(game.settings.time_bank % 60).padStart(2, '0')}`;
+            const buttonHtml = game.creator_sid === socket.id ? `<button class="cancel-btn btn-danger">Отменить</button>` : `<button class="play-btn" data-creator-sid="${game.creator_sid}">Играть</button>`;
+            const roundsText = game.settings.selected_clubs ? `${game.settings.selected_clubs.length} раундов (выбраны)` : `${game.settings.num_rounds} раундов`;
+            gameItem.innerHTML = `<div class="info"><span class="creator">${game.creator_nickname} (${game.creator_rating})</span><div class="details">РПЛ, ${roundsText}, ${time_str}</div></div>${buttonHtml}`;
+            openGamesList.appendChild(gameItem);
+        });
+    }
+    createGameBtn.disabled = userHasOpenGame;
+});
+
+socket.on('update_lobby_stats', (data) => {
+    onlinePlayersCount.textContent = data.online_players;
+    activeGamesCount.textContent = data.active_games;
+});
+
+socket.on('league_clubs_data', (data) => {
+    const configListDiv = document.getElementById('config-clubs-list');
+    const trainingListDiv = document.getElementById('training-clubs-list');
+    configListDiv.innerHTML = '';
+    trainingListDiv.innerHTML = '';
+
+    data.clubs.forEach(clubName => {
+        const itemHtml = `<label class="club-item"><input type="checkbox" value="${clubName}">${clubName}</label>`;
+        configListDiv.innerHTML += itemHtml;
+        trainingListDiv.innerHTML += itemHtml;
+    });
+    
+    const numberOfClubs = data.clubs.length;
+    if (numberOfClubs > 0) {
+        configRoundsSlider.max = numberOfClubs;
+        configRoundsSlider.value = numberOfClubs; 
+        configRoundsValue.textContent = numberOfClubs;
+
+        trainingRoundsSlider.max = numberOfClubs;
+        const trainingDefaultValue = Math.min(5, numberOfClubs);
+        trainingRoundsSlider.value = trainingDefaultValue;
+        trainingRoundsValue.textContent = trainingDefaultValue;
+    }
+});
+
+socket.on('live_games_data', (data) => {
+    liveGamesList.innerHTML = '';
+    if (!data || data.length === 0) {
+        liveGamesList.innerHTML = '<p>Сейчас никто не играет.</p>';
+        return;
+    }
+    data.forEach(game => {
+        const gameItem = document.createElement('div');
+        gameItem.className = 'open-game-item';
+        gameItem.innerHTML = `<div class="info"><span class="creator">${game.players[0].nickname} ${game.scores[0]} : ${game.scores[1]} ${game.players[1].nickname}</span><div class="details">Тур ${game.round}/${game.totalRounds}, зрителей: ${game.spectators}</div></div><button class="spectate-btn" data-room-id="${game.roomId}">Смотреть</button>`;
+        liveGamesList.appendChild(gameItem);
+    });
+});
+
+socket.on('spectator_snapshot', (state) => {
+    showScreen('spectator');
+    updateSpectatorUI(state);
+});
+
+socket.on('spectator_game_over', (data) => {
+    clearInterval(spectatorInterval);
+    spectatorStatus.textContent = `Игра окончена: ${data.players[0].nickname} ${data.final_scores[0]} : ${data.final_scores[1]} ${data.players[1].nickname}`;
+});
+
+socket.on('spectator_game_cancelled', (data) => {
+    clearInterval(spectatorInterval);
+    spectatorStatus.textContent = data.message;
+});
+
+socket.on('leaderboard_data', (data) => {
+    leaderboardBody.innerHTML = '';
+    data.forEach((user, index) => {
+        const row = document.createElement('tr');
+        row.innerHTML = `<td>${index + 1}</td><td>${user.nickname}</td><td>${user.rating}</td>`;
+        leaderboardBody.appendChild(row);
+    });
+});
+
+socket.on('round_started', (state) => {
+    clearInterval(summaryInterval);
+    showScreen('game');
+    updateGameUI(state);
+});
+
+socket.on('turn_updated', (state) => {
+    updateGameUI(state);
+});
+
+socket.on('guess_result', (data) => {
+    clearTimeout(gameStatusTimeout);
+    let message = '';
+    switch(data.result) {
+        case 'correct': message = '✅ Верно!'; break;
+        case 'correct_typo': message = `✅ Верно! (Засчитано как: ${data.corrected_name})`; break;
+        case 'already_named': message = 'Такого уже называли!'; break;
+        default: message = '❌ Неверно!';
+    }
+    gameStatus.textContent = message;
+    gameStatusTimeout = setTimeout(() => {
+        if (Object.keys(clientState).length > 0 && clientState.players[clientState.currentPlayerIndex]) {
+            const currentTurnPlayer = clientState.players[clientState.currentPlayerIndex];
+            gameStatus.textContent = isMyTurn ? 'Ваш ход...' : `Ожидаем ход игрока ${currentTurnPlayer.nickname}...`;
+        }
+    }, 2000);
+});
+
+socket.on('round_summary', (data) => {
+    const isSolo = data.mode === 'solo';
+    showScreen('summary');
+    skipPauseBtn.disabled = false;
+    skipPauseBtn.textContent = 'Пропустить';
+    summaryHeader.textContent = `Итоги раунда: ${data.clubName}`;
+    
+    summaryScoreDisplay.classList.toggle('hidden', isSolo);
+    summaryBotColumn.classList.toggle('hidden', isSolo);
+
+    if (!isSolo) {
+        summaryScoreDisplay.textContent = `${data.players[0].nickname} ${data.scores[0]} : ${data.scores[1]} ${data.players[1].nickname}`;
+        summaryBotNameHeader.textContent = data.players[1].nickname;
+    }
+    summaryHumanNameHeader.textContent = data.players[0].nickname;
+    
+    summaryHumanNamedList.innerHTML = ''; 
+    summaryBotNamedList.innerHTML = ''; 
+    summaryRemainingList.innerHTML = '';
+    
+    const allNamedPlayerNames = new Set(data.namedPlayers.map(p => p.full_name));
+    
+    data.namedPlayers.forEach(player => {
+        const pDiv = document.createElement('div');
+        pDiv.className = 'player-name';
+        pDiv.textContent = player.full_name;
+        if (player.by === 0) summaryHumanNamedList.appendChild(pDiv);
+        else summaryBotNamedList.appendChild(pDiv);
+    });
+    
+    data.fullPlayerList.forEach(playerName => {
+        if (!allNamedPlayerNames.has(playerName)) {
+            const pDiv = document.createElement('div');
+            pDiv.className = 'player-name';
+            pDiv.textContent = playerName;
+            summaryRemainingList.appendChild(pDiv);
+        }
+    });
+
+    let countdown = 10;
+    summaryCountdown.textContent = countdown;
+    clearInterval(summaryInterval);
+    summaryInterval = setInterval(() => {
+        countdown--;
+        summaryCountdown.textContent = countdown >= 0 ? countdown : 0;
+        if (countdown < 0) clearInterval(summaryInterval);
+    }, 1000);
+});
+
+function renderRatingChanges(ratingChanges, player1Name, player2Name) {
+    if (!ratingChanges) {
+        ratingChangesDisplay.classList.add('hidden');
+        return;
+    }
+    const p1_change = ratingChanges.p1.new - ratingChanges.p1.old;
+    const p2_change = ratingChanges.p2.new - ratingChanges.p2.old;
+    const p1_sign = p1_change >= 0 ? '+' : ''; const p2_sign = p2_change >= 0 ? '+' : '';
+    ratingChangesDisplay.innerHTML = `<div class="rating-change">${player1Name}: ${ratingChanges.p1.old} → ${ratingChanges.p1.new} (<span class="${p1_change >= 0 ? 'rating-positive' : 'rating-negative'}">${p1_sign}${p1_change}</span>)</div><div class="rating-change">${player2Name}: ${ratingChanges.p2.old} → ${ratingChanges.p2.new} (<span class="${p2_change >= 0 ? 'rating-positive' : 'rating-negative'}">${p2_sign}${p2_change}</span>)</div>`;
+    ratingChangesDisplay.classList.remove('hidden');
+}
+
+// Записанные в БД рейтинги разошлись с показанными в game_over — обновляем экран итогов этой игры
+socket.on('rating_changes_corrected', (data) => {
+    if (!lastGameOver || lastGameOver.roomId !== data.roomId) return;
+    renderRatingChanges(data.rating_changes, lastGameOver.player1Name, lastGameOver.player2Name);
+});
+
+socket.on('game_over', (data) => {
+    if (data.mode === 'solo') {
+        showScreen('lobby');
+        return;
+    }
+    showScreen('gameOver');
+    const player1Name = data.players[0].nickname;
+    const player2Name = data.players[1].nickname;
+    if (data.final_scores[0] > data.final_scores[1]) { gameOverTitle.textContent = `🏆 Победил ${player1Name}!`; } 
+    else if (data.final_scores[1] > data.final_scores[0]) { gameOverTitle.textContent = `🏆 Победил ${player2Name}!`; } 
+    else { gameOverTitle.textContent = "🤝 Ничья!"; }
+    earlyEndExplanation.classList.toggle('hidden', data.end_reason !== 'unreachable_score');
+    finalScoreDisplay.textContent = `${player1Name} ${data.final_scores[0]} : ${data.final_scores[1]} ${player2Name}`;
+    
+    lastGameOver = { roomId: data.roomId, player1Name, player2Name };
+    renderRatingChanges(data.mode === 'pvp' ? data.rating_changes : null, player1Name, player2Name);
+
+    const tableHead = gameHistoryTable.querySelector('thead');
+    const tableBody = gameHistoryTable.querySelector('tbody');
+    tableHead.innerHTML = `<tr><th>Клуб</th><th>${player1Name}</th><th>${player2Name}</th><th>Причина</th></tr>`;
+    tableBody.innerHTML = '';
+    if (data.history && data.history.length > 0) {
+        gameHistoryContainer.classList.remove('hidden');
+        data.history.forEach(round => {
+            const row = document.createElement('tr');
+            let reasonText = '';
+            switch(round.result_type) {
+                case 'completed': reasonText = 'Завершен'; break;
+                case 'timeout': reasonText = `Время вышло (${round.player_nickname})`; break;
+                case 'surrender': reasonText = `Сдался (${round.player_nickname})`; break;
+                default: reasonText = '---';
+            }
+            row.innerHTML = `<td>${round.club_name}</td><td>${round.p1_named}</td><td>${round.p2_named}</td><td>${reasonText}</td>`;
+            tableBody.appendChild(row);
+        });
+    } else {
+        gameHistoryContainer.classList.add('hidden');
+    }
+});
+
+socket.on('opponent_disconnected', (data) => {
+    clearInterval(timerInterval);
+    clearInterval(summaryInterval);
+    document.getElementById('disconnection-message').textContent = data.message;
+    showScreen('disconnection');
+});
+
+// Инициализация
+window.addEventListener('load', () => {
+    const savedNickname = localStorage.getItem('rpl_quiz_nickname');
+    if (savedNickname) {
+        currentUserNickname = savedNickname;
+        welcomeNickname.textContent = currentUserNickname;
+        showScreen('lobby');
+        socket.emit('get_league_clubs', { league: 'РПЛ' });
+        socket.emit('get_live_games');
+    } else { 
+        showScreen('auth'); 
+    }
+});